@@ -1,30 +1,53 @@
 import polars as pl # 0.20.31
 from datetime import date, time, datetime, timedelta
-import pytz
 import os
-import io
+import re
+import json
+import tempfile
+import unicodedata
+import hashlib
+import hmac
+import logging
+import threading
+from array import array
+from bisect import bisect_left, insort
+import time as reloj
+from collections import deque, namedtuple
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
 
-from sqlalchemy import create_engine, URL, text
-from sqlalchemy.orm import Session
-from sqlalchemy.ext.automap import automap_base
-from sqlalchemy.pool import NullPool
+from sqlalchemy import create_engine, URL, text, inspect, Column, SmallInteger, Integer, String, Date, Time
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.pool import QueuePool
 
 import dash
-from dash import dcc
+from dash import dcc, html, Input, Output, State, ClientsideFunction
 import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
-from dash_extensions.enrich import Input, Output, State, DashProxy, MultiplexerTransform, html
 from dash.exceptions import PreventUpdate
+from flask import request, Response, g, send_file, abort, has_request_context
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 
-from reportlab.pdfgen.canvas import Canvas
-from reportlab.lib.colors import HexColor
+import referencias
+import reportes
+import sesiones
+import metricas
+from calendario import Calendario
+
+logger = logging.getLogger('app-visitas')
+
+# inicio del arranque del worker (para medir el arranque en frío)
+inicio_arranque = reloj.perf_counter()
 
 ### Parámetros
-# período de duración de las visitas
+# temporada vigente (TEMPORADA) y período de duración de sus visitas;
+# TEMPORADAS lista las temporadas anteriores que se pueden consultar (solo lectura)
 
-fecha_inicial = date(2025, 3, 1)
-fecha_final = date(2025, 11, 30)
+temporada = referencias.temporada
+fecha_inicial, fecha_final = referencias.rango_temporada(temporada)
+temporadas = sorted({int(anio) for anio in os.environ.get('TEMPORADAS', '').split(',') if anio.strip()} | {temporada}, reverse=True)
 
 # inicialización de usuario
 
@@ -42,17 +65,140 @@ objeto_url = URL.create(
     database = os.environ['PGDATABASE'],
 )
 
-engine = create_engine(objeto_url, pool_pre_ping=True, poolclass=NullPool)  # actualizar: os.environ['DATABASE_PRIVATE_URL']
-# engine = create_engine(os.environ['DATABASE_PRIVATE_URL'], pool_pre_ping=True, poolclass=NullPool)
+# pool de conexiones (configurable por variables de entorno)
 
-# creación de clases de las bases de datos
+pool_config = {
+    'pool_size': int(os.environ.get('PG_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('PG_POOL_MAX_OVERFLOW', 10)),
+    'pool_recycle': int(os.environ.get('PG_POOL_RECYCLE', 1800)),
+    'pool_timeout': int(os.environ.get('PG_POOL_TIMEOUT', 30)),
+}
 
-Base = automap_base()
-Base.prepare(autoload_with=engine)
+# estadísticas de obtención de conexiones del pool
+
+candado_pool = threading.Lock()
+
+def estadisticas_pool_iniciales():
+    return {
+        'checkouts': 0,
+        'checkout_total': 0.,
+        'checkout_max': 0.,
+        'esperas': 0,
+        'espera_total': 0.,
+        'espera_max': 0.,
+    }
+
+estadisticas_pool = estadisticas_pool_iniciales()
+
+class PoolMedido(QueuePool):
+    # registra la latencia de checkout y el tiempo de espera cuando el pool está copado
+    def connect(self):
+        copado = self.checkedout() >= self.size() + pool_config['max_overflow']
+        inicio = reloj.perf_counter()
+        conexion = super().connect()
+        duracion = reloj.perf_counter() - inicio
+
+        with candado_pool:
+            estadisticas_pool['checkouts'] += 1
+            estadisticas_pool['checkout_total'] += duracion
+            estadisticas_pool['checkout_max'] = max(estadisticas_pool['checkout_max'], duracion)
+            if copado:
+                estadisticas_pool['esperas'] += 1
+                estadisticas_pool['espera_total'] += duracion
+                estadisticas_pool['espera_max'] = max(estadisticas_pool['espera_max'], duracion)
+        return conexion
+
+def reporte_pool():
+    with candado_pool:
+        est = dict(estadisticas_pool)
+    return {
+        'pid': os.getpid(),
+        'config': pool_config,
+        'estado': engine.pool.status(),
+        'checkouts': est['checkouts'],
+        'checkout_promedio_ms': 1000 * est['checkout_total'] / max(est['checkouts'], 1),
+        'checkout_max_ms': 1000 * est['checkout_max'],
+        'esperas': est['esperas'],
+        'espera_promedio_ms': 1000 * est['espera_total'] / max(est['esperas'], 1),
+        'espera_max_ms': 1000 * est['espera_max'],
+    }
+
+engine = create_engine(objeto_url, pool_pre_ping=True, poolclass=PoolMedido, **pool_config)  # actualizar: os.environ['DATABASE_PRIVATE_URL']
+# engine = create_engine(os.environ['DATABASE_PRIVATE_URL'], pool_pre_ping=True, poolclass=PoolMedido, **pool_config)
+
+# tras un fork cada proceso hijo abre sus propias conexiones (no comparte las del padre)
+def reinicia_pool():
+    engine.dispose(close=False)
+    estadisticas_pool.update(estadisticas_pool_iniciales())
+
+os.register_at_fork(after_in_child=reinicia_pool)
+
+# clases de las bases de datos (declaradas: el arranque no refleja el esquema)
+
+Base = declarative_base()
+
+class Propuesta(Base):
+    __tablename__ = 'propuestas'
+
+    prop_id = Column(SmallInteger, primary_key=True)
+    organizador_id = Column(SmallInteger)
+    organizador = Column(String)
+    rbd = Column(Integer)
+    nombre = Column(String)
+
+class Programada(Base):
+    __tablename__ = 'programadas'
+
+    prog_id = Column(SmallInteger, primary_key=True)
+    organizador_id = Column(SmallInteger)
+    organizador = Column(String)
+    fecha = Column(Date, index=True)
+    rbd = Column(Integer)
+    nombre = Column(String)
+    direccion = Column(String)
+    comuna_id = Column(SmallInteger)
+    hora_ini = Column(Time)
+    hora_fin = Column(Time)
+    hora_ins = Column(Time)
+    contacto = Column(String)
+    contacto_tel = Column(String)
+    contacto_mail = Column(String)
+    contacto_cargo = Column(String)
+    orientador = Column(String)
+    orientador_tel = Column(String)
+    orientador_mail = Column(String)
+    estatus = Column(String)
+    observaciones = Column(String)
+
+class Asiste(Base):
+    __tablename__ = 'asisten'
+
+    programada_id = Column(SmallInteger, primary_key=True)
+    organizador_id = Column(SmallInteger, primary_key=True)
+    asiste = Column(SmallInteger)
+
+# compara las clases declaradas con el esquema de la base (opcional: VERIFICA_ESQUEMA=1)
+def verifica_esquema():
+    inspector = inspect(engine)
+    diferencias = {}
+    for clase in (Propuesta, Programada, Asiste):
+        tabla = clase.__tablename__
+        declaradas = set(clase.__table__.columns.keys())
+        en_base = {columna['name'] for columna in inspector.get_columns(tabla)}
+        if declaradas != en_base:
+            diferencias[tabla] = {
+                'faltan_en_base': sorted(declaradas - en_base),
+                'no_declaradas': sorted(en_base - declaradas),
+            }
+    # las consultas por temporada filtran por rango de fecha (ver scripts/temporadas.sql)
+    indexadas = {tuple(indice['column_names']) for indice in inspector.get_indexes('programadas')}
+    if ('fecha',) not in indexadas:
+        diferencias.setdefault('programadas', {})['falta_indice'] = ['fecha']
+    return diferencias
 
-Propuesta = Base.classes.propuestas
-Programada = Base.classes.programadas
-Asiste = Base.classes.asisten
+if os.environ.get('VERIFICA_ESQUEMA') == '1':
+    for tabla, diferencia in verifica_esquema().items():
+        logger.warning('esquema de %s difiere de la clase declarada: %s', tabla, diferencia)
 
 ### Lectura de datos
 # función que convierte columnas datetime a str
@@ -80,9 +226,6 @@ def lectura(db, consume=False):
     return df.to_dicts(), df.schema
 
 
-programadas, schema_programada = lectura('programadas')
-propuestas, schema_propuesta = lectura('propuestas')
-
 schema_programada = pl.Schema({
     'prog_id': pl.Int16,
     'organizador_id': pl.Int8,
@@ -114,42 +257,388 @@ schema_propuesta = pl.Schema({
     'nombre': pl.Utf8,
 })
 
-# crea diccionario rbd->nombre y rbd->codigo_comuna
+### Instantánea de programadas
+# copia tipada de la tabla en el servidor (fecha: pl.Date, horas: pl.Time), fuente de las vistas
+# cada escritura la actualiza y devuelve solo las filas afectadas, junto con la versión resultante
 
-colegios = dict(
-    pl.read_parquet('./data/colegios.parquet')
-    .select(['rbd', 'nombre'])
-    .rows()
-)
+sql_programadas = text('SELECT * FROM programadas WHERE fecha BETWEEN :inicio AND :fin')
 
-colegios_comuna = dict(
-    pl.read_parquet('./data/colegios.parquet')
-    .select(['rbd', 'cod_com'])
-    .rows()
-)
+def lee_programadas(inicio=fecha_inicial, fin=fecha_final):
+    return (
+        pl.read_database(
+            query = sql_programadas,
+            connection = engine,
+            execute_options = {'parameters': {'inicio': inicio, 'fin': fin}},
+        )
+        .select(list(schema_programada.keys()))
+        .cast(dict(schema_programada))
+        .sort(['fecha', 'prog_id'])
+    )
 
-# crea listado con los feriados y fines de semana
+inicio_proceso = datetime.now().strftime('%Y%m%d%H%M%S%f')
+candado_programadas = threading.Lock()
+
+instantanea = {
+    'cargada': False,
+    'leido': None,
+    'refrescando': False,
+    'base': None,           # versión de programadas en la base al leerla (ver vigencia entre workers)
+    'df': pl.DataFrame(schema=schema_programada),
+    'version': 0,
+    'cambios': deque(maxlen=500),
+    'filas': {},            # prog_id -> fila
+    'por_fecha': {},        # fecha -> [prog_id] ordenados
+    'por_organizador': {},  # organizador_id -> [(fecha, prog_id)] ordenados
+}
 
-feriados = (
-    pl.read_parquet('./data/feriados2025.parquet')
-    .to_series()
-    .to_list()
-)
+# índices por fecha y por organizador (se mantienen con el candado tomado)
+
+def indexa(fila):
+    instantanea['filas'][fila['prog_id']] = fila
+    insort(instantanea['por_fecha'].setdefault(fila['fecha'], []), fila['prog_id'])
+    insort(instantanea['por_organizador'].setdefault(fila['organizador_id'], []), (fila['fecha'], fila['prog_id']))
+
+def desindexa(id_prog):
+    fila = instantanea['filas'].pop(id_prog, None)
+    if fila is None:
+        return
+    ids = instantanea['por_fecha'][fila['fecha']]
+    ids.remove(id_prog)
+    if not ids:
+        del instantanea['por_fecha'][fila['fecha']]
+    instantanea['por_organizador'][fila['organizador_id']].remove((fila['fecha'], id_prog))
+
+def reindexa(df):
+    instantanea['df'] = df
+    instantanea['filas'] = {}
+    instantanea['por_fecha'] = {}
+    instantanea['por_organizador'] = {}
+    for fila in df.to_dicts():
+        indexa(fila)
+
+# la primera lectura se hace al primer uso, no al importar el módulo
+def carga_instantanea():
+    if not instantanea['cargada']:
+        base = version_base('programadas')
+        df = lee_programadas()
+        with candado_programadas:
+            if not instantanea['cargada']:
+                reindexa(df)
+                instantanea['cargada'] = True
+                instantanea['leido'] = reloj.monotonic()
+                instantanea['base'] = base
+
+def asegura_instantanea():
+    verifica_versiones()
+    carga_instantanea()
+
+# identifica la instantánea del proceso (cada worker de gunicorn tiene la suya)
+origen_programadas = lambda: f'{os.getpid()}-{inicio_proceso}'
+
+# los DataFrame no se modifican en el lugar: basta leer la referencia vigente
+def instantanea_programadas():
+    asegura_instantanea()
+    return instantanea['df']
+
+# temporadas anteriores: instantáneas de solo lectura, leídas una vez por worker y guardadas en parquet
+# (DIR_ARCHIVO) para que los siguientes arranques no consulten la base
+
+dir_archivo = os.environ.get('DIR_ARCHIVO', './data/archivo')
+archivo_temporadas = {}
+candado_archivo = threading.Lock()
+
+def lee_temporada_archivada(anio):
+    ruta = os.path.join(dir_archivo, f'programadas{anio}.parquet')
+    if os.path.exists(ruta):
+        return pl.read_parquet(ruta)
+    df = lee_programadas(*referencias.rango_temporada(anio))
+    try:
+        os.makedirs(dir_archivo, exist_ok=True)
+        df.write_parquet(ruta)
+    except OSError:
+        logger.warning('no se pudo guardar el archivo de la temporada %s en %s', anio, dir_archivo)
+    return df
 
-# crea diccionario codigo->comuna
+def programadas_temporada(anio=temporada):
+    if anio == temporada:
+        return instantanea_programadas()
+    if anio not in temporadas:
+        raise ValueError(f'temporada no configurada: {anio}')
+    with candado_archivo:
+        if anio not in archivo_temporadas:
+            archivo_temporadas[anio] = lee_temporada_archivada(anio)
+        return archivo_temporadas[anio]
+
+# temporada pedida desde el navegador (None: la vigente): solo se aceptan la vigente y las de TEMPORADAS, antes de
+# leer la base o escribir el archivo de una temporada
+def temporada_pedida(anio):
+    if anio is None:
+        return temporada
+    if anio not in temporadas:
+        raise PreventUpdate
+    return anio
 
-comunas = dict(
-    pl.read_parquet('./data/comunas.parquet')
-    .sort('comuna')
-    .rows()
-)
+# convierte fechas y horas de una fila al formato del store
+def fila_a_str(fila):
+    return {k: v.isoformat() if isinstance(v, (date, time)) else v for k, v in fila.items()}
 
-# crea diccionario con la división horaria de la jornada
+# proyección de la grilla que viaja al store del navegador (sin datos de contacto ni observaciones);
+# el detalle completo de una visita se obtiene en el servidor con detalle_programada
+def filas_store(df):
+    return (
+        df
+        .select(orden)
+        .with_columns(pl.col('fecha').dt.strftime('%Y-%m-%d'))
+        .to_dicts()
+    )
 
-horas_15 = dict(
-    pl.read_parquet('./data/div_horas.parquet')
-    .rows()
-)
+def fila_programada(visita):
+    return {k: getattr(visita, k) for k in schema_programada.keys()}
+
+def registra_cambios(agrega=(), elimina=()):
+    agrega_df = pl.DataFrame(list(agrega), schema=schema_programada)
+    elimina = list(elimina)
+    agrega_str = filas_store(agrega_df)
+
+    # sin revisar los contadores: la escritura que se registra avanza la base al terminar (avanza_bases)
+    carga_instantanea()
+    with candado_programadas:
+        ids = elimina + agrega_df.get_column('prog_id').to_list()
+        instantanea['df'] = (
+            pl.concat([instantanea['df'].filter(~pl.col('prog_id').is_in(ids)), agrega_df])
+            .sort(['fecha', 'prog_id'])
+        )
+        for id_prog in ids:
+            desindexa(id_prog)
+        for fila in agrega_df.to_dicts():
+            indexa(fila)
+
+        desde = instantanea['version']
+        instantanea['version'] += 1
+        instantanea['cambios'].append({
+            'version': desde + 1,
+            'agrega': agrega_str,
+            'elimina': elimina,
+        })
+
+    return {
+        'origen': origen_programadas(),
+        'desde': desde,
+        'version': desde + 1,
+        'completo': False,
+        'agrega': agrega_str,
+        'elimina': elimina,
+    }
+
+# paquete completo para el store datos-programadas; con la grilla en el servidor (MODELO_GRILLA=servidor) ninguna
+# vista lee las filas del store y solo se envían el origen y la versión
+def paquete_programadas():
+    asegura_instantanea()
+    with candado_programadas:
+        df, version = instantanea['df'], instantanea['version']
+    paquete = {
+        'origen': origen_programadas(),
+        'version': version,
+    }
+    if not grilla_servidor:
+        paquete['filas'] = filas_store(df)
+    return paquete
+
+# cambios acumulados desde la versión del cliente; si las versiones divergen se envía la tabla completa
+def cambios_desde(origen, version):
+    asegura_instantanea()
+    with candado_programadas:
+        actual = instantanea['version']
+        cambios = [c for c in instantanea['cambios'] if c['version'] > version]
+        continuo = (
+            origen == origen_programadas()
+            and version <= actual
+            and (version == actual or (cambios != [] and cambios[0]['version'] == version + 1))
+        )
+        df = instantanea['df']
+
+    if not continuo:
+        return {
+            'origen': origen_programadas(),
+            'desde': None,
+            'version': actual,
+            'completo': True,
+            'agrega': None if grilla_servidor else filas_store(df),
+            'elimina': [],
+        }
+
+    agrega = {}
+    elimina = set()
+    for cambio in cambios:
+        for id_prog in cambio['elimina']:
+            agrega.pop(id_prog, None)
+            elimina.add(id_prog)
+        for fila in cambio['agrega']:
+            agrega[fila['prog_id']] = fila
+            elimina.discard(fila['prog_id'])
+
+    return {
+        'origen': origen_programadas(),
+        'desde': version,
+        'version': actual,
+        'completo': False,
+        'agrega': list(agrega.values()),
+        'elimina': list(elimina),
+    }
+
+# cambios para el store del cliente que hizo una escritura, desde su propio origen y versión (version-programadas):
+# si el store lo generó otro worker se envía la tabla completa del worker que escribió, que ya incluye la escritura
+def cambios_cliente(cliente):
+    if not cliente:
+        return cambios_desde(None, -1)
+    return cambios_desde(cliente['origen'], cliente['version'])
+
+# relee la tabla; la versión solo cambia si la base difiere de la instantánea (p. ej. escrituras de otro worker).
+# si una escritura propia cambió la instantánea durante la lectura, se descarta lo leído (como en carga_matriz)
+# y el próximo refresco vuelve a intentar; devuelve si la lectura se aplicó
+def recarga_programadas():
+    with candado_programadas:
+        version = instantanea['version']
+    base = version_base('programadas')
+    df = lee_programadas()
+    with candado_programadas:
+        if instantanea['version'] != version:
+            return False
+        if not instantanea['cargada']:
+            reindexa(df)
+            instantanea['cargada'] = True
+        elif not df.equals(instantanea['df']):
+            reindexa(df)
+            instantanea['version'] += 1
+            instantanea['cambios'].clear()
+        instantanea['leido'] = reloj.monotonic()
+        instantanea['base'] = base
+    return True
+
+# relee en segundo plano una caché vencida; el pedido en curso usa la versión vigente
+
+ttl_instantanea = int(os.environ.get('TTL_INSTANTANEA', 60))
+candado_refresco = threading.Lock()
+
+def refresca_si_vencida(cache, ttl, fn):
+    with candado_refresco:
+        vencida = cache['leido'] is not None and reloj.monotonic() - cache['leido'] > ttl
+        if not vencida or cache['refrescando']:
+            return
+        cache['refrescando'] = True
+
+    def tarea():
+        try:
+            fn()
+        finally:
+            cache['refrescando'] = False
+
+    threading.Thread(target=tarea, daemon=True).start()
+
+# una visita leída por su clave (visitas que aún no están en la instantánea); None si no existe
+sql_programada = text('SELECT * FROM programadas WHERE prog_id = :id')
+
+def lee_programada(id_prog):
+    df = (
+        pl.read_database(
+            query = sql_programada,
+            connection = engine,
+            execute_options = {'parameters': {'id': id_prog}},
+        )
+        .select(list(schema_programada.keys()))
+        .cast(dict(schema_programada))
+    )
+    return df.row(0, named=True) if df.height else None
+
+# detalle de una visita (con fechas y horas tipadas, o como texto si consume=True); None si la visita no existe
+def detalle_programada(id_prog, consume=False, anio=temporada):
+    if anio != temporada:
+        fila = programadas_temporada(anio).row(by_predicate=pl.col('prog_id') == id_prog, named=True)
+    else:
+        asegura_instantanea()
+        with candado_programadas:
+            fila = instantanea['filas'].get(id_prog)
+        if fila is None:
+            fila = lee_programada(id_prog)
+            if fila is None:
+                return None
+    if consume:
+        fila = fila_a_str(fila)
+    return dict(fila)
+
+# visitas de una fecha y visitas futuras de un organizador, en O(k) sobre el resultado
+def filas_fecha(fecha):
+    asegura_instantanea()
+    with candado_programadas:
+        return [instantanea['filas'][i] for i in instantanea['por_fecha'].get(fecha, [])]
+
+def filas_organizador(organizador_id, desde):
+    asegura_instantanea()
+    with candado_programadas:
+        claves = instantanea['por_organizador'].get(organizador_id, [])
+        return [instantanea['filas'][i] for _, i in claves[bisect_left(claves, (desde,)):]]
+
+# datos de referencia (módulo referencias): rbd->nombre, rbd->codigo_comuna, codigo->comuna,
+# división horaria de la jornada y feriados; se actualizan en su lugar al recargar
+
+colegios = referencias.colegios
+colegios_comuna = referencias.colegios_comuna
+comunas = referencias.comunas
+horas_15 = referencias.horas_15
+feriados = referencias.feriados
+
+# índice de búsqueda de colegios: tokens de nombre y RBD, sin tildes y en minúsculas, ordenados para buscar por prefijo
+
+max_busqueda = int(os.environ.get('MAX_BUSQUEDA', 50))
+
+indice_colegios = {
+    'tokens': [],
+    'rbds': [],
+    'nombres': {},
+}
+
+def normaliza(texto):
+    return unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode().lower()
+
+def indexa_colegios():
+    nombres = {rbd: ' '.join(re.findall(r'\w+', normaliza(nombre))) for rbd, nombre in colegios.items()}
+    pares = sorted({(token, rbd) for rbd, nombre in nombres.items() for token in nombre.split() + [str(rbd)]})
+    indice_colegios['tokens'] = [token for token, _ in pares]
+    indice_colegios['rbds'] = [rbd for _, rbd in pares]
+    indice_colegios['nombres'] = nombres
+    busca_colegios.cache_clear()
+
+# función que entrega los RBD cuyos tokens comienzan con cada palabra buscada (los que parten con la búsqueda primero)
+
+@lru_cache(maxsize=2048)
+def busca_colegios(texto):
+    consulta = re.findall(r'\w+', normaliza(texto))
+    if not consulta:
+        return ()
+
+    tokens, rbds, nombres = indice_colegios['tokens'], indice_colegios['rbds'], indice_colegios['nombres']
+    encontrados = None
+    for palabra in consulta:
+        i = bisect_left(tokens, palabra)
+        j = bisect_left(tokens, palabra + '\uffff')
+        coincidencias = set(rbds[i:j])
+        encontrados = coincidencias if encontrados is None else encontrados & coincidencias
+        if not encontrados:
+            return ()
+
+    inicio = ' '.join(consulta)
+    return tuple(sorted(encontrados, key=lambda rbd: (not nombres[rbd].startswith(inicio), nombres[rbd]))[:max_busqueda])
+
+# opciones del selector de colegio: coincidencias de la búsqueda, manteniendo siempre el colegio seleccionado
+
+def opciones_colegio(texto, valor=None):
+    rbds = list(busca_colegios(texto)) if texto else []
+    if valor in colegios and valor not in rbds:
+        rbds.insert(0, valor)
+    return [{'label': colegios[rbd], 'value': rbd} for rbd in rbds]
+
+indexa_colegios()
+referencias.al_recargar(indexa_colegios)
 
 # universidades que participan en las visitas
 
@@ -175,10 +664,12 @@ universidades_inv = {v: k for k, v in universidades.items()}
 
 
 ### Funciones
-# registra la fecha actual (instantánea) en Santiago
+# calendario de días hábiles de la temporada; registra la fecha actual en Santiago (se renueva a medianoche)
 
-ahora = lambda: datetime.now(pytz.timezone('America/Santiago')).date()
-dia_laboral = lambda: min({ahora() + timedelta(days=i) for i in range(14)}.difference(feriados))
+calendario = Calendario(fecha_inicial, fecha_final, feriados)
+referencias.al_recargar(lambda: calendario.carga(feriados))
+
+ahora = calendario.hoy
 
 # función que crea las opciones de visualización de meses
 
@@ -216,11 +707,11 @@ def opciones(dic):
 
 # función que crea lista de fechas bloqueadas (local)
 def bloqueados_local():
-    if programadas == []:
+    if instantanea_programadas().is_empty():
         return []
     else:
         return list(
-            pl.DataFrame(programadas)
+            instantanea_programadas()
             .group_by('fecha')
             .agg(
                 pl.count('prog_id').alias('cantidad')
@@ -231,14 +722,56 @@ def bloqueados_local():
         )
 
 # función que verifica fechas bloqueadas (base)
+#sql_bloqueadas = text("SELECT * FROM bloqueados")
+sql_bloqueadas = text("SELECT fecha FROM bloqueadas() AS fecha WHERE fecha BETWEEN :inicio AND :fin")
+
+def lee_bloqueados(session):
+    return [item[0] for item in session.execute(sql_bloqueadas, {'inicio': fecha_inicial, 'fin': fecha_final}).all()]
+
 def verifica_bloqueados():
-#    sql = text("SELECT * FROM bloqueados")
-    sql = text("SELECT * FROM bloqueadas()")
     with Session(engine) as session:
-        resultados = session.execute(sql).all()
-    return [item[0] for item in resultados]
+        return lee_bloqueados(session)
+
+# caché de fechas bloqueadas: la actualizan las escrituras propias (en su misma sesión) y las relecturas de la
+# instantánea, y se relee en segundo plano cuando vence el TTL; el selector de fechas no consulta la base (la
+# reserva vuelve a verificar el cupo dentro de su transacción)
+
+ttl_bloqueadas = int(os.environ.get('TTL_BLOQUEADAS', 30))
+candado_bloqueadas = threading.Lock()
+
+cache_bloqueadas = {
+    'fechas': set(),
+    'leido': None,
+    'refrescando': False,
+}
+
+def actualiza_bloqueadas(fechas):
+    with candado_bloqueadas:
+        cache_bloqueadas['fechas'] = set(fechas)
+        cache_bloqueadas['leido'] = reloj.monotonic()
+
+def refresca_bloqueadas():
+    try:
+        actualiza_bloqueadas(verifica_bloqueados())
+    finally:
+        cache_bloqueadas['refrescando'] = False
+
+def bloqueadas_cache():
+    with candado_bloqueadas:
+        leido = cache_bloqueadas['leido']
+        vencido = leido is not None and reloj.monotonic() - leido > ttl_bloqueadas
+        if vencido and not cache_bloqueadas['refrescando']:
+            cache_bloqueadas['refrescando'] = True
+            threading.Thread(target=refresca_bloqueadas, daemon=True).start()
+
+    if leido is None:
+        refresca_bloqueadas()
+
+    return set(cache_bloqueadas['fechas'])
 
 def chk_bloqueado(fecha, fn, excluye=None):
+    if fecha != excluye and not calendario.reservable(fecha):
+        return True
     bloqueados = fn()
     if excluye in bloqueados:
         bloqueados.remove(excluye)
@@ -283,17 +816,7 @@ def convierte_esp(fecha):
 
 
 #### Programadas
-# función que crea datos de visualización (insumo: lista de diccionarios) (no lee datos externos)
-
-actualiza = {
-    'fecha': pl.Utf8,
-    'hora_ini': pl.Utf8,
-    'hora_fin': pl.Utf8,
-    'hora_ins': pl.Utf8,
-}
-
-schema_programada_lectura = dict(schema_programada).copy()
-schema_programada_lectura.update(actualiza)
+# funciones que crean datos de visualización (insumo: instantánea de programadas) (no leen datos externos)
 
 orden = ['prog_id', 'fecha', 'rbd', 'nombre', 'organizador_id', 'organizador', 'estatus']
 
@@ -322,127 +845,440 @@ map_orden_todas = {
 
 map_orden = {k: map_orden_todas[k] for k in orden}
 
-def programadas_vista(datos, mes=0):
-    df = (
-        pl.DataFrame(datos, schema=schema_programada_lectura)
-        .select(orden)
-        .with_columns(
-            pl.col('fecha').str.strptime(pl.Date, '%Y-%m-%d'),
-        )
-    )
+def programadas_mes(mes=0, anio=temporada):
+    df = programadas_temporada(anio).select(orden)
     if mes != 0:
         df = df.filter(pl.col('fecha').dt.month() == mes)
 
-    return df.sort(['fecha', 'prog_id']).to_dicts()
+    return df
 
 
-def programadas_fecha(datos, fecha):
-    return (
-        pl.DataFrame(datos, schema=schema_programada_lectura)
-        .select(orden)
-        .filter(pl.col('fecha').str.strptime(pl.Date, '%Y-%m-%d') == fecha)
-        .with_columns([
-            pl.col('fecha').str.strptime(pl.Date, '%Y-%m-%d'),
-            pl.arange(1, pl.len()+1).alias('orden'),
-        ])
-        .sort(['fecha', 'prog_id'])
-    ).to_dicts()
+def programadas_vista(mes=0, anio=temporada):
+    return programadas_mes(mes, anio).to_dicts()
 
+# visitas completas de un mes (y opcionalmente de un organizador) para los reportes en lote
 
-def programadas_usuario(datos, usuario, hoy):
-    return (
-        pl.DataFrame(datos, schema=schema_programada_lectura)
-        .select(orden)
-        .filter((pl.col('organizador_id') == usuario) & (pl.col('fecha').str.strptime(pl.Date, '%Y-%m-%d') >= hoy))
-        .with_columns([
-            pl.col('fecha').str.strptime(pl.Date, '%Y-%m-%d'),
-        ])
-        .sort(['fecha', 'prog_id'])
-        .with_columns([
-            pl.arange(1, pl.len()+1).alias('orden'),
-        ])
-        .to_dicts()
-    )
+def tabla_reportes(mes=0, anio=temporada, organizador_id=None):
+    df = programadas_temporada(anio)
+    if mes != 0:
+        df = df.filter(pl.col('fecha').dt.month() == mes)
+    if organizador_id:
+        df = df.filter(pl.col('organizador_id') == organizador_id)
+    return df.sort(['fecha', 'prog_id'])
+
+
+### Modelo de filas en el servidor
+# con MODELO_GRILLA=servidor las grillas viz-ferias y viz-col-prop-gral usan el modelo infinito de AG Grid:
+# el navegador pide ventanas de filas y el filtrado, el orden y el mes se resuelven con Polars
 
+grilla_servidor = os.environ.get('MODELO_GRILLA', 'cliente') == 'servidor'
+bloque_grilla = int(os.environ.get('BLOQUE_GRILLA', 100))
 
-def exporta_programada(datos, mes, usuario):
-    output = io.BytesIO()
+filtros_texto = {
+    'contains': lambda col, valor: col.str.contains(valor, literal=True),
+    'notContains': lambda col, valor: ~col.str.contains(valor, literal=True),
+    'equals': lambda col, valor: col == valor,
+    'notEqual': lambda col, valor: col != valor,
+    'startsWith': lambda col, valor: col.str.starts_with(valor),
+    'endsWith': lambda col, valor: col.str.ends_with(valor),
+}
+
+filtros_numero = {
+    'equals': lambda col, valor, hasta: col == valor,
+    'notEqual': lambda col, valor, hasta: col != valor,
+    'lessThan': lambda col, valor, hasta: col < valor,
+    'lessThanOrEqual': lambda col, valor, hasta: col <= valor,
+    'greaterThan': lambda col, valor, hasta: col > valor,
+    'greaterThanOrEqual': lambda col, valor, hasta: col >= valor,
+    'inRange': lambda col, valor, hasta: col.is_between(valor, hasta),
+}
+
+# función que traduce el filtro de una columna de AG Grid (simple o combinado) a una expresión de Polars; los tipos
+# de filtro que no están en los diccionarios anteriores se ignoran (None)
+
+def expr_filtro(columna, filtro):
+    if not isinstance(filtro, dict):
+        return None
+    if 'conditions' in filtro:
+        exprs = [e for e in (expr_filtro(columna, condicion) for condicion in filtro['conditions'] or []) if e is not None]
+        if not exprs:
+            return None
+        expr = exprs[0]
+        for otra in exprs[1:]:
+            expr = (expr | otra) if filtro.get('operator') == 'OR' else (expr & otra)
+        return expr
+
+    tipo = filtro.get('type')
+    if tipo == 'blank':
+        return pl.col(columna).is_null()
+    if tipo == 'notBlank':
+        return pl.col(columna).is_not_null()
+
+    if filtro.get('filterType') == 'number':
+        numeros = [v for v in (filtro.get('filter'), filtro.get('filterTo')) if v is not None]
+        if tipo not in filtros_numero or not all(isinstance(v, (int, float)) for v in numeros):
+            return None
+        return filtros_numero[tipo](pl.col(columna), filtro.get('filter'), filtro.get('filterTo'))
+
+    if tipo not in filtros_texto:
+        return None
+    # los filtros de texto de AG Grid no distinguen mayúsculas
+    col = pl.col(columna).cast(pl.Utf8).str.to_lowercase()
+    return filtros_texto[tipo](col, str(filtro.get('filter', '')).lower()).fill_null(False)
+
+# función que aplica filtros y orden de la solicitud y entrega la ventana de filas pedida; solo se aceptan las
+# columnas de la grilla (columnDefs) y los órdenes asc/desc, el resto de la solicitud del navegador se descarta
+
+def ventana_filas(df, solicitud, columnas):
+    for columna, filtro in (solicitud.get('filterModel') or {}).items():
+        expr = expr_filtro(columna, filtro) if columna in columnas else None
+        if expr is not None:
+            df = df.filter(expr)
+
+    orden_sol = [
+        s for s in solicitud.get('sortModel') or []
+        if isinstance(s, dict) and s.get('colId') in columnas and s.get('sort') in ('asc', 'desc')
+    ]
+    if orden_sol:
+        df = df.sort(
+            [s['colId'] for s in orden_sol],
+            descending=[s['sort'] == 'desc' for s in orden_sol],
+            nulls_last=True,
+            maintain_order=True,
+        )
+
+    inicio = solicitud.get('startRow', 0)
+    fin = solicitud.get('endRow', inicio + bloque_grilla)
+    return {'rowData': df.slice(inicio, fin - inicio).to_dicts(), 'rowCount': df.height}
+
+def campos_grilla(definiciones):
+    return {columna['field'] for columna in definiciones}
+
+# opciones comunes de las grillas según el modelo de filas
+
+def opciones_grilla():
+    if grilla_servidor:
+        return {
+            'rowSelection': 'single',
+            'rowModelType': 'infinite',
+            'cacheBlockSize': bloque_grilla,
+            'maxBlocksInCache': 10,
+            'infiniteInitialRowCount': bloque_grilla,
+        }
+    return {'rowSelection': 'single'}
+
+
+def programadas_fecha(fecha):
+    return [{k: fila[k] for k in orden} | {'orden': n} for n, fila in enumerate(filas_fecha(fecha), start=1)]
+
+
+def programadas_usuario(usuario, hoy):
+    return [{k: fila[k] for k in orden} | {'orden': n} for n, fila in enumerate(filas_organizador(usuario, hoy), start=1)]
+
+
+def tabla_programada(mes, usuario, anio=temporada):
     df = (
-        pl.DataFrame(datos, schema=schema_programada_lectura)
-        .with_columns([
-            pl.col('fecha').str.strptime(pl.Date, '%Y-%m-%d'),
+        programadas_temporada(anio)
+        .with_columns(
             pl.col('comuna_id').replace_strict(comunas),
-        ])
+        )
         .select({0: orden}.get(usuario, list(map_orden_todas.keys())))
         .rename({0: map_orden}.get(usuario, map_orden_todas))
     )
     if mes != 0:
         df = df.filter(pl.col('Fecha').dt.month() == mes)
-    df.sort(['Fecha', 'ID']).write_excel(workbook=output, autofilter=False)
 
-    return output.getvalue()
+    return df.sort(['Fecha', 'ID'])
 
 
 # funciones para la descarga de información detallada de visitas
 
 univ = {str(k): v for k, v in universidades.items()}
 
-def asisten_todas():
-    return (
-        pl.read_database(
-            query = 'SELECT * FROM asisten',
+# rango de fechas de la temporada o de un mes de ella: el predicado sobre fecha puede usar el índice
+
+def rango_fechas(mes=0, anio=temporada):
+    inicio, fin = referencias.rango_temporada(anio)
+    if mes:
+        inicio = max(inicio, date(anio, mes, 1))
+        fin = min(fin, date(anio + mes // 12, mes % 12 + 1, 1) - timedelta(days=1))
+    return inicio, fin
+
+orden2 = ['fecha', 'prog_id', 'organizador', 'nombre', 'rbd', 'direccion', 'comuna_id', 'hora_ins', 'hora_ini', 'hora_fin',
+          'contacto', 'contacto_tel', 'contacto_mail', 'contacto_cargo', 'orientador', 'orientador_tel', 'orientador_mail', 'estatus', 'observaciones']
+
+# detalle de visitas con la asistencia de cada universidad en columnas (agregación condicional en la base)
+
+columnas_detalle = ', '.join(f'p.{columna}' for columna in orden2)
+columnas_asiste = ',\n'.join(
+    f"""    CASE max(a.asiste) FILTER (WHERE a.organizador_id = {k}) WHEN 1 THEN 'Sí' WHEN 0 THEN 'No' END AS "{k}\""""
+    for k in universidades
+)
+
+sql_detalle = text(f"""
+SELECT {columnas_detalle},
+{columnas_asiste}
+FROM programadas p
+LEFT JOIN asisten a ON a.programada_id = p.prog_id
+WHERE p.fecha BETWEEN :inicio AND :fin
+GROUP BY {columnas_detalle}
+ORDER BY p.fecha, p.prog_id
+""")
+
+schema_detalle = {k: schema_programada[k] for k in orden2} | {k: pl.Utf8 for k in univ}
+
+# la temporada vigente se arma con la instantánea y la matriz de asistencia, sin consultar la base
+
+def lee_detalle(mes=0, anio=temporada):
+    inicio, fin = rango_fechas(mes, anio)
+    if anio != temporada:
+        df = pl.read_database(
+            query = sql_detalle,
             connection = engine,
+            execute_options = {'parameters': {'inicio': inicio, 'fin': fin}},
         )
-        .rename({'programada_id': 'prog_id'})
+    else:
+        df = programadas_temporada(anio).filter(pl.col('fecha').is_between(inicio, fin)).select(orden2)
+        df = pl.concat([df, pivote_asisten(df.get_column('prog_id').to_list())], how='horizontal')
+    return df.cast(schema_detalle).rename(univ)
+
+def tabla_programada_detalle(mes=0, anio=temporada):
+    return (
+        lee_detalle(mes, anio)
         .with_columns(
-            pl.col('asiste').replace_strict({0: 'No', 1: 'Sí'})
+            pl.col('comuna_id').replace_strict(comunas, return_dtype=pl.Utf8)
         )
-        .pivot(
-            index='prog_id',
-            columns='organizador_id',
-            values='asiste',
-        )
-        .rename(univ)
-        .select(['prog_id'] + list(universidades.values()))
+        .rename(map_orden_todas, strict=False)
     )
 
-orden2 = ['fecha', 'prog_id', 'organizador_id', 'organizador', 'nombre', 'rbd', 'direccion', 'comuna_id', 'hora_ins', 'hora_ini', 'hora_fin',
-          'contacto', 'contacto_tel', 'contacto_mail', 'contacto_cargo', 'orientador', 'orientador_tel', 'orientador_mail', 'estatus', 'observaciones']
-
-def exporta_programada_detalle(mes=0):
-    sql = 'SELECT * FROM programadas'
-    if mes:
-        sql = f'SELECT * FROM programadas WHERE EXTRACT(MONTH FROM fecha) = {mes}'
 
-    output = io.BytesIO()
-    df = (
-        pl.read_database(query = sql, connection = engine)
-        .with_columns(
-            pl.col('comuna_id').replace_strict(comunas)
-        )
-        .select(orden2)
-        .join(asisten_todas(), how='left', on='prog_id')
-        .rename(map_orden_todas)
-        .sort(['Fecha', 'ID'])
-        .drop(['Código'])
-        .write_excel(workbook=output, autofilter=False)
+#### Matriz de asistencia
+# asistencia de la temporada vigente en un arreglo de enteros pequeños (array 'b'): una fila por visita y una
+# columna (ranura) por universidad, con -1 si no hay registro, 0 si no asiste y 1 si asiste. Se lee al primer uso,
+# se actualiza con cada cambio de asistencia y cada visita agregada o eliminada, y se relee en segundo plano al
+# vencer (como la instantánea) para recoger las escrituras de otros workers
+
+ranuras = {organizador_id: n for n, organizador_id in enumerate(universidades)}
+n_ranuras = len(ranuras)
+sin_registro = -1
+
+matriz_asisten = {
+    'cargada': False,
+    'leido': None,
+    'refrescando': False,
+    'base': None,       # versión de asisten en la base al leerla
+    'version': 0,       # cambios locales (una relectura iniciada antes de un cambio se descarta)
+    'datos': array('b'),
+    'filas': {},        # prog_id -> fila
+    'libres': [],       # filas de visitas eliminadas, que se reutilizan
+}
+candado_matriz = threading.Lock()
+
+sql_matriz_asisten = text("""
+SELECT p.prog_id, a.organizador_id, a.asiste
+FROM programadas p
+LEFT JOIN asisten a ON a.programada_id = p.prog_id
+WHERE p.fecha BETWEEN :inicio AND :fin
+ORDER BY p.prog_id, a.organizador_id
+""")
+
+def lee_matriz():
+    filas, datos = {}, array('b')
+    with engine.connect() as conexion:
+        for id_prog, organizador_id, asiste in conexion.execute(sql_matriz_asisten, {'inicio': fecha_inicial, 'fin': fecha_final}):
+            if id_prog not in filas:
+                filas[id_prog] = len(filas)
+                datos.extend([sin_registro] * n_ranuras)
+            if organizador_id in ranuras:
+                datos[filas[id_prog] * n_ranuras + ranuras[organizador_id]] = asiste
+    return filas, datos
+
+def carga_matriz(forzar=False):
+    with candado_matriz:
+        version = matriz_asisten['version']
+    base = version_base('asisten')
+    filas, datos = lee_matriz()
+    with candado_matriz:
+        if matriz_asisten['version'] == version and (forzar or not matriz_asisten['cargada']):
+            matriz_asisten.update(filas=filas, datos=datos, libres=[], cargada=True, base=base)
+        matriz_asisten['leido'] = reloj.monotonic()
+
+def asegura_matriz():
+    verifica_versiones()
+    if not matriz_asisten['cargada']:
+        carga_matriz()
+
+recarga_matriz = lambda: carga_matriz(forzar=True)
+
+# celdas de una visita; None si la visita no está en la matriz (temporadas archivadas, visitas de otro worker)
+
+def celdas_fila(datos, n):
+    celdas = datos[n * n_ranuras:(n + 1) * n_ranuras]
+    return {organizador_id: celdas[r] for organizador_id, r in ranuras.items() if celdas[r] != sin_registro}
+
+def fila_asisten(id_prog):
+    with candado_matriz:
+        n = matriz_asisten['filas'].get(id_prog)
+        return None if n is None else celdas_fila(matriz_asisten['datos'], n)
+
+# actualizaciones (solo si la matriz ya se leyó: si no, la primera lectura las incluye)
+
+def agrega_matriz(id_prog, dic):
+    with candado_matriz:
+        if not matriz_asisten['cargada']:
+            return
+        filas, datos = matriz_asisten['filas'], matriz_asisten['datos']
+        if id_prog not in filas:
+            if matriz_asisten['libres']:
+                filas[id_prog] = matriz_asisten['libres'].pop()
+            else:
+                filas[id_prog] = len(datos) // n_ranuras
+                datos.extend([sin_registro] * n_ranuras)
+        for organizador_id, asiste in dic.items():
+            if organizador_id in ranuras:
+                datos[filas[id_prog] * n_ranuras + ranuras[organizador_id]] = asiste
+        matriz_asisten['version'] += 1
+
+def quita_matriz(id_prog):
+    with candado_matriz:
+        n = matriz_asisten['filas'].pop(id_prog, None)
+        if n is None:
+            return
+        matriz_asisten['datos'][n * n_ranuras:(n + 1) * n_ranuras] = array('b', [sin_registro] * n_ranuras)
+        matriz_asisten['libres'].append(n)
+        matriz_asisten['version'] += 1
+
+def marca_asiste(id_prog, organizador_id, asiste):
+    with candado_matriz:
+        n = matriz_asisten['filas'].get(id_prog)
+        if n is not None and organizador_id in ranuras:
+            matriz_asisten['datos'][n * n_ranuras + ranuras[organizador_id]] = asiste
+            matriz_asisten['version'] += 1
+
+# asistencia de una visita recién insertada (los registros los crea la base al insertar la visita)
+
+def registra_asistencia(session, id_prog):
+    filas = session.execute(sql_asistencia, {'ids': [id_prog]})
+    agrega_matriz(id_prog, {organizador_id: asiste for _, organizador_id, asiste in filas})
+
+# cantidad de visitas a las que asiste cada universidad (todas las de la temporada o las indicadas)
+
+def conteo_asisten(ids=None):
+    asegura_matriz()
+    refresca_si_vencida(matriz_asisten, ttl_instantanea, recarga_matriz)
+    cuenta = [0] * n_ranuras
+    with candado_matriz:
+        filas, datos = matriz_asisten['filas'], matriz_asisten['datos']
+        for n in (filas.values() if ids is None else [filas[i] for i in ids if i in filas]):
+            for r, asiste in enumerate(datos[n * n_ranuras:(n + 1) * n_ranuras]):
+                cuenta[r] += asiste == 1
+    return {organizador_id: cuenta[r] for organizador_id, r in ranuras.items()}
+
+# columnas de asistencia ('Sí'/'No') de las visitas indicadas, en el mismo orden, para la descarga detallada;
+# se arma en el hilo de la exportación, fuera de un pedido: si la matriz venció se relee antes de usarla
+
+etiquetas_asiste = {1: 'Sí', 0: 'No', sin_registro: None}
+
+def pivote_asisten(ids):
+    asegura_matriz()
+    if reloj.monotonic() - matriz_asisten['leido'] > ttl_instantanea:
+        recarga_matriz()
+    columnas = [[] for _ in range(n_ranuras)]
+    vacia = array('b', [sin_registro] * n_ranuras)
+    with candado_matriz:
+        filas, datos = matriz_asisten['filas'], matriz_asisten['datos']
+        for id_prog in ids:
+            n = filas.get(id_prog)
+            celdas = vacia if n is None else datos[n * n_ranuras:(n + 1) * n_ranuras]
+            for r in range(n_ranuras):
+                columnas[r].append(etiquetas_asiste[celdas[r]])
+    return pl.DataFrame(
+        {str(organizador_id): columnas[r] for organizador_id, r in ranuras.items()},
+        schema={str(organizador_id): pl.Utf8 for organizador_id in ranuras},
     )
-    return output.getvalue()
 
+# compara la matriz con la tabla asisten (a pedido: /estado/asistencia, que informa además el conteo por universidad)
+
+def verifica_matriz():
+    asegura_matriz()
+    filas, datos = lee_matriz()
+    with candado_matriz:
+        en_memoria = {id_prog: celdas_fila(matriz_asisten['datos'], n) for id_prog, n in matriz_asisten['filas'].items()}
+    en_base = {id_prog: celdas_fila(datos, n) for id_prog, n in filas.items()}
+    return {
+        'visitas': len(en_base),
+        'faltan': sorted(en_base.keys() - en_memoria.keys()),
+        'sobran': sorted(en_memoria.keys() - en_base.keys()),
+        'difieren': sorted(i for i in en_base.keys() & en_memoria.keys() if en_base[i] != en_memoria[i]),
+    }
+
+# asistencia por visita ({organizador_id: asiste}): se toma de la matriz; las visitas que no están en ella se leen con
+# una consulta parametrizada por la clave de asisten y quedan en una caché por visita que invalidan cambia_asiste y la
+# eliminación de visitas (y que vence a los ttl_instantanea segundos, para recoger los cambios de otros workers)
+
+sql_asistencia = text(
+    'SELECT programada_id, organizador_id, asiste FROM asisten WHERE programada_id = ANY(:ids) ORDER BY programada_id, organizador_id'
+)
+
+cache_asistencia = {}   # prog_id -> (leido, {organizador_id: asiste})
+candado_asistencia = threading.Lock()
+
+def lee_asistencia(ids):
+    leidas = {id_prog: {} for id_prog in ids}
+    with engine.connect() as conexion:
+        for id_prog, organizador_id, asiste in conexion.execute(sql_asistencia, {'ids': list(ids)}):
+            leidas[id_prog][organizador_id] = asiste
+    ahora_cache = reloj.monotonic()
+    with candado_asistencia:
+        cache_asistencia.update({id_prog: (ahora_cache, dic) for id_prog, dic in leidas.items()})
+    return leidas
+
+def invalida_asistencia(id_prog):
+    with candado_asistencia:
+        cache_asistencia.pop(id_prog, None)
+
+# estructura de asistencia de varias visitas: las que no están en la matriz ni en caché se leen en una sola consulta
+
+def asistencias(ids, usuario=None):
+    asegura_matriz()
+    refresca_si_vencida(matriz_asisten, ttl_instantanea, recarga_matriz)
+    vigentes = {i: fila for i in ids if (fila := fila_asisten(i)) is not None}
+    limite = reloj.monotonic() - ttl_instantanea
+    with candado_asistencia:
+        vigentes |= {i: cache_asistencia[i][1] for i in ids if i not in vigentes and i in cache_asistencia and cache_asistencia[i][0] > limite}
+    faltan = [i for i in ids if i not in vigentes]
+    if faltan:
+        vigentes |= lee_asistencia(faltan)
+
+    return {
+        id_prog: {
+            'todas': dic,
+            'asisten': [k for k, v in dic.items() if v == 1],
+            'no_asisten': [k for k, v in dic.items() if v == 0],
+            'usuario': dic.get(usuario),
+        }
+        for id_prog, dic in vigentes.items()
+    }
 
-# función que lee universidades que asisten a visita
+def asistencia(id_prog, usuario=None):
+    return asistencias([id_prog], usuario)[id_prog]
+
+# reserva de cupo: bloqueo consultivo por fecha dentro de la transacción de la escritura,
+# de modo que dos reservas simultáneas para el mismo día se verifican e insertan en serie
+
+FechaLlena = namedtuple('FechaLlena', ['fecha'])
+
+sql_bloqueo_fecha = text("SELECT pg_advisory_xact_lock(hashtext('programadas'), :dia)")
+
+def reserva_fecha(session, fecha):
+    session.execute(sql_bloqueo_fecha, {'dia': fecha.toordinal()})
+    bloqueados = lee_bloqueados(session)
+    actualiza_bloqueadas(bloqueados)
+    return fecha not in bloqueados
 
-def dic_asisten(id_prog):
-    return dict(
-        pl.read_database(
-            query = f'SELECT * FROM asisten WHERE programada_id = {id_prog} ORDER BY organizador_id',
-            connection = engine,
-        )
-        .select(['organizador_id', 'asiste'])
-        .iter_rows()
-    )
 
 # funciones que agregan, modifican y eliminan una programada (toman datos externos)
+# devuelven los cambios respecto de la versión anterior, o FechaLlena si la fecha no tiene cupo
 
 def ob_prog(dic):
     return Programada(
@@ -472,21 +1308,35 @@ def nueva_programada(dic):
     programada = ob_prog(dic)
 
     with Session(engine) as session:
+        if not reserva_fecha(session, dic['fecha']):
+            return FechaLlena(dic['fecha'])
+        antes = bloquea_versiones(session, 'programadas', 'asisten')
         session.add(programada)
+        despues = versiones_escritas(session, antes)
         session.commit()
+        fila = fila_programada(programada)
+        registra_asistencia(session, programada.prog_id)
+        actualiza_bloqueadas(lee_bloqueados(session))
 
-    return lectura('programadas')[0]
+    cambios = registra_cambios(agrega=[fila])
+    avanza_bases(antes, despues)
+    return cambios
 
 
-def modifica_programada(id_prog, dic, cambia_fecha=False, consume=False):
+def modifica_programada(id_prog, dic, cambia_fecha=False):
 
     with Session(engine) as session:
         visita = session.query(Programada).filter(Programada.prog_id == id_prog).first()
         if cambia_fecha:
+            if not reserva_fecha(session, dic['fecha']):
+                return FechaLlena(dic['fecha'])
+            antes = bloquea_versiones(session, 'programadas', 'asisten')
             session.delete(visita)
             agrega = ob_prog(dic)
             session.add(agrega)
         else:
+            antes = bloquea_versiones(session, 'programadas')
+            agrega = visita
             visita.fecha = dic['fecha'],
             visita.direccion = dic['direccion'],
             visita.comuna_id = dic['comuna_id'],
@@ -503,26 +1353,53 @@ def modifica_programada(id_prog, dic, cambia_fecha=False, consume=False):
             visita.estatus = dic['estatus'],
             visita.observaciones = dic['observaciones'],
 
+        despues = versiones_escritas(session, antes)
         session.commit()
+        fila = fila_programada(agrega)
+        if cambia_fecha:
+            quita_matriz(id_prog)
+            invalida_asistencia(id_prog)
+            registra_asistencia(session, agrega.prog_id)
+        actualiza_bloqueadas(lee_bloqueados(session))
 
-    return lectura('programadas', consume=consume)[0]
+    cambios = registra_cambios(agrega=[fila], elimina=[id_prog] if cambia_fecha else [])
+    avanza_bases(antes, despues)
+    return cambios
 
 
-def elimina_programada(id, consume=False):
+def elimina_programada(id):
     with Session(engine) as session:
+        antes = bloquea_versiones(session, 'programadas', 'asisten')
         elimina = session.query(Programada).filter(Programada.prog_id == id).first()
         session.delete(elimina)
+        despues = versiones_escritas(session, antes)
         session.commit()
+        actualiza_bloqueadas(lee_bloqueados(session))
 
-    return lectura('programadas', consume=consume)[0]
+    quita_matriz(id)
+    invalida_asistencia(id)
+    cambios = registra_cambios(elimina=[id])
+    avanza_bases(antes, despues)
+    return cambios
 
 # modifica condición de asistente
 
+estado_asisten = {'version': 0}
+
 def cambia_asiste(usuario, programada, asiste):
+    # el selector se inicializa con el valor vigente: sin cambio no se escribe
+    if asistencia(programada, usuario)['usuario'] == asiste:
+        return
     with Session(engine) as session:
+        antes = bloquea_versiones(session, 'asisten')
         modifica = session.query(Asiste).filter(Asiste.organizador_id == usuario).filter(Asiste.programada_id == programada).first()
         modifica.asiste = asiste,
+        despues = versiones_escritas(session, antes)
         session.commit()
+    marca_asiste(programada, usuario, asiste)
+    invalida_asistencia(programada)
+    estado_asisten['version'] += 1
+    avanza_bases(antes, despues)
 
 # reporte
 
@@ -530,60 +1407,35 @@ orden_reporte = ['organizador', 'nombre', 'rbd', 'fecha', 'direccion', 'comuna_i
 map_orden_reporte = map_orden_todas.copy()
 map_orden_reporte['organizador'] = 'Organizador'
 
-def def_asisten(id_prog):
-    return (
-        pl.read_database(
-            query = 'SELECT * FROM asisten',
-            connection = engine,
-        )
-        .filter((pl.col('asiste') == 1) & (pl.col('programada_id') == id_prog))
-        .sort('organizador_id')
-        .to_dicts()
-    )
+# página de reporte de una visita (valores ya formateados) y documento de una sola visita
 
-def exporta_reporte(visita, asisten):
-    output = io.BytesIO()
-
-    cm = 72. / 2.54
-    top = 792. - (1.3 * cm) - 24
-    step = 19
-    canvas = Canvas(output, pagesize=(612., 792.))
-
-    canvas.setFont('Helvetica', 24)
-    canvas.setFillColor(HexColor('#1b81e5'))
-    canvas.drawCentredString(306, top, 'Programa de Visitas a Colegios 2025')
-    top -= (step + 14)
+def pagina_reporte(visita, asisten):
+    return {
+        'titulo': f"Programa de Visitas a Colegios {visita['fecha'][:4]}",
+        'items': [(map_orden_reporte[item], formato_items.get(item, lambda x: x)(visita[item])) for item in orden_reporte],
+        'universidades': [universidades[organizador_id] for organizador_id in asisten],
+    }
 
-    canvas.setFont('Helvetica', 16)
-    canvas.drawString((2 * cm), top, 'Antecedentes de la Visita')
-    top -= (step + 4)
-
-    canvas.setFont('Helvetica', 12)
-    canvas.setFillColor(HexColor('#596a6d'))
-    for item in orden_reporte:
-        canvas.drawString((2.5 * cm), top, f'{map_orden_reporte[item]}')
-        canvas.drawString((2.5 * cm)*2.02, top, ':')
-        canvas.drawString((2.5 * cm)*2.17, top, f'{formato_items.get(item, lambda x: x)(visita[item])}')
-        top -= step
-
-    top -= step
-    canvas.setFont('Helvetica', 16)
-    canvas.setFillColor(HexColor('#1b81e5'))
-    canvas.drawString((2 * cm), top, 'Universidades Participantes')
-    top -= (step + 4)
+def exporta_reporte(visita, asisten):
+    return reportes.pdf([pagina_reporte(visita, asisten)])
 
-    canvas.setFont('Helvetica', 12)
-    canvas.setFillColor(HexColor('#596a6d'))
-    for asiste in asisten:
-        canvas.drawString((2.5 * cm), top, f"{universidades[asiste['organizador_id']]}")
-        top -= step
+# reportes de un conjunto de visitas: la asistencia que falta en caché se lee en una sola consulta
 
-    canvas.save()
+procesos_reportes = int(os.environ.get('PROCESOS_REPORTES', 2))
+lote_reportes = int(os.environ.get('LOTE_REPORTES', 100))
 
-    retorna = output.getvalue()
-    output.close()
+def escribe_reportes(df, ruta, formato):
+    visitas = [fila_a_str(fila) for fila in df.to_dicts()]
+    asisten = asistencias([visita['prog_id'] for visita in visitas]) if visitas else {}
+    paginas = [pagina_reporte(visita, asisten[visita['prog_id']]['asisten']) for visita in visitas]
 
-    return retorna
+    if formato == 'zip':
+        nombres = [f"reporte_{visita['fecha']}_{visita['rbd']}_{visita['prog_id']}.pdf" for visita in visitas]
+        reportes.escribe_zip(nombres, paginas, ruta, procesos=procesos_reportes, lote=lote_reportes)
+    elif procesos_reportes > 1 and len(paginas) > lote_reportes:
+        reportes.escribe_pdf_proceso(paginas, ruta)
+    else:
+        reportes.escribe_pdf(paginas, ruta)
 
 
 #### Propuestas
@@ -597,22 +1449,71 @@ def propuesta_vista(datos, usuario=None):
             .select(['prop_id', 'organizador_id', 'rbd', 'nombre']).to_dicts()
         )
     else:
-        return (
-            pl.DataFrame(datos, schema=schema_propuesta)
-            .sort(['organizador_id'])
-            .select(['rbd', 'nombre', 'organizador']).to_dicts()
-        )
+        return propuestas_gral(datos).to_dicts()
 
 
-def exporta_propuesta(datos):
-    output = io.BytesIO()
-    (
+def propuestas_gral(datos):
+    return (
+        pl.DataFrame(datos, schema=schema_propuesta)
+        .sort(['organizador_id'])
+        .select(['rbd', 'nombre', 'organizador'])
+    )
+
+
+def tabla_propuesta(datos):
+    return (
         pl.DataFrame(datos, schema=schema_propuesta)
         .sort(['organizador_id'])
         .select(['rbd', 'nombre', 'organizador'])
         .rename({'rbd': 'RBD', 'nombre': 'Colegio', 'organizador': 'Proponente'})
-    ).write_excel(workbook=output, autofilter=False)
-    return output.getvalue()
+    )
+
+# formatos de descarga: escritura a archivo y tipo de contenido
+
+formatos_descarga = {
+    'xlsx': (lambda df, ruta: df.write_excel(workbook=ruta, autofilter=False), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': (lambda df, ruta: df.write_csv(ruta), 'text/csv'),
+    'parquet': (lambda df, ruta: df.write_parquet(ruta), 'application/vnd.apache.parquet'),
+    'pdf': (lambda df, ruta: escribe_reportes(df, ruta, 'pdf'), 'application/pdf'),
+    'zip': (lambda df, ruta: escribe_reportes(df, ruta, 'zip'), 'application/zip'),
+}
+
+# caché versionada del listado de propuestas (la actualizan las escrituras propias)
+
+candado_propuestas = threading.Lock()
+
+cache_propuestas = {
+    'filas': None,
+    'version': 0,
+    'leido': None,
+    'refrescando': False,
+    'base': None,
+}
+
+def actualiza_propuestas(filas, version=None, base=None):
+    with candado_propuestas:
+        if version is not None and cache_propuestas['version'] != version:
+            return cache_propuestas['filas']
+        if filas != cache_propuestas['filas']:
+            cache_propuestas['filas'] = filas
+            cache_propuestas['version'] += 1
+        cache_propuestas['leido'] = reloj.monotonic()
+        if base is not None:
+            cache_propuestas['base'] = base
+    return filas
+
+# relectura: se descarta si una escritura propia actualizó la caché durante la lectura
+def recarga_propuestas():
+    with candado_propuestas:
+        version = cache_propuestas['version']
+    base = version_base('propuestas')
+    return actualiza_propuestas(lectura('propuestas')[0], version, base)
+
+def propuestas_cache():
+    verifica_versiones()
+    if cache_propuestas['filas'] is None:
+        recarga_propuestas()
+    return cache_propuestas['filas']
 
 # funciones que agregan y eliminan una propuesta (de base PostgreSQL)
 
@@ -625,19 +1526,130 @@ def nueva_propuesta(dic):
     )
 
     with Session(engine) as session:
+        antes = bloquea_versiones(session, 'propuestas')
         session.add(propuesta)
+        despues = versiones_escritas(session, antes)
         session.commit()
 
-    return lectura('propuestas')[0]
+    filas = actualiza_propuestas(lectura('propuestas')[0])
+    avanza_bases(antes, despues)
+    return filas
 
 
 def elimina_propuesta(id):
     with Session(engine) as session:
+        antes = bloquea_versiones(session, 'propuestas')
         elimina = session.query(Propuesta).filter(Propuesta.prop_id == id).first()
         session.delete(elimina)
+        despues = versiones_escritas(session, antes)
         session.commit()
 
-    return lectura('propuestas')[0]
+    filas = actualiza_propuestas(lectura('propuestas')[0])
+    avanza_bases(antes, despues)
+    return filas
+
+
+### Vigencia entre workers
+# cada worker de gunicorn tiene sus propias copias de programadas, asisten y propuestas. La tabla versiones
+# (scripts/versiones.sql) lleva un contador por tabla que los triggers de la base incrementan con cada escritura, de
+# cualquier worker; cada copia guarda el contador que tenía la base al leerla (base). Las escrituras propias leen el
+# contador dentro de su transacción y avanzan la base de la copia que actualizan, de modo que solo las escrituras de
+# otros workers dejan una copia atrasada. Los contadores se revisan en un pedido cada INTERVALO_VERSIONES segundos
+# como máximo (una consulta de tres filas) y las copias atrasadas se releen antes de responder.
+# Sin la tabla, las copias se releen en segundo plano al vencer el TTL
+
+sql_versiones = text('SELECT tabla, version FROM versiones')
+sql_bloquea_versiones = text('SELECT tabla, version FROM versiones WHERE tabla = ANY(:tablas) ORDER BY tabla FOR UPDATE')
+
+intervalo_versiones = float(os.environ.get('INTERVALO_VERSIONES', 5))
+
+vigencia = {
+    'activa': None,     # None: aún no se sabe si existe la tabla
+    'versiones': {},
+    'revisado': None,
+}
+candado_vigencia = threading.Lock()
+
+def lee_versiones():
+    if vigencia['activa'] is False:
+        return {}
+    try:
+        with engine.connect() as conexion:
+            versiones = dict(conexion.execute(sql_versiones).all())
+    except ProgrammingError:
+        vigencia['activa'] = False
+        logger.warning('no existe la tabla versiones (scripts/versiones.sql): las copias de cada worker se releen por TTL')
+        return {}
+    vigencia.update(activa=True, versiones=versiones, revisado=reloj.monotonic())
+    return versiones
+
+# contador con que se rotula una lectura (se lee antes que los datos: una base atrasada solo causa otra relectura)
+def version_base(tabla):
+    if vigencia['revisado'] is None:
+        lee_versiones()
+    return vigencia['versiones'].get(tabla)
+
+# escrituras: contadores de las tablas que escribe la transacción, tomados antes de escribir y bloqueados hasta el
+# commit (ningún otro worker los incrementa entretanto); después de escribir se releen en la misma transacción
+
+def bloquea_versiones(session, *tablas):
+    if vigencia['activa'] is None:
+        lee_versiones()
+    if not vigencia['activa']:
+        return {}
+    return dict(session.execute(sql_bloquea_versiones, {'tablas': list(tablas)}).all())
+
+def versiones_escritas(session, antes):
+    if not antes:
+        return {}
+    session.flush()
+    return dict(session.execute(sql_bloquea_versiones, {'tablas': list(antes)}).all())
+
+# relecturas por tabla (las de programadas y asisten arrastran las cachés que dependen de ellas)
+
+def recarga_programadas_vigencia():
+    if recarga_programadas():
+        actualiza_bloqueadas(verifica_bloqueados())
+
+def recarga_asisten_vigencia():
+    recarga_matriz()
+    with candado_asistencia:
+        cache_asistencia.clear()
+    estado_asisten['version'] += 1
+
+vigiladas = {
+    'programadas': (instantanea, candado_programadas, recarga_programadas_vigencia),
+    'asisten': (matriz_asisten, candado_matriz, recarga_asisten_vigencia),
+    'propuestas': (cache_propuestas, candado_propuestas, recarga_propuestas),
+}
+
+# después de aplicar una escritura propia a las copias: si la copia estaba al día antes de la escritura, queda al día
+def avanza_bases(antes, despues):
+    for tabla, version in antes.items():
+        cache, candado, _ = vigiladas[tabla]
+        with candado:
+            if cache['base'] == version:
+                cache['base'] = despues[tabla]
+
+def verifica_versiones():
+    if not has_request_context():
+        return
+    revisado = vigencia['revisado']
+    if revisado is not None and reloj.monotonic() - revisado < intervalo_versiones:
+        return
+    with candado_vigencia:
+        revisado = vigencia['revisado']
+        if revisado is not None and reloj.monotonic() - revisado < intervalo_versiones:
+            return
+        versiones = lee_versiones()
+        if not versiones:
+            refresca_si_vencida(instantanea, ttl_instantanea, recarga_programadas)
+            refresca_si_vencida(matriz_asisten, ttl_instantanea, recarga_matriz)
+            refresca_si_vencida(cache_propuestas, ttl_instantanea, recarga_propuestas)
+            return
+        for tabla, (cache, _, recarga) in vigiladas.items():
+            if cache['base'] is not None and cache['base'] < versiones.get(tabla, cache['base']):
+                recarga()
 
 
 ### Construcción de la aplicación
@@ -648,10 +1660,6 @@ color = '#2FA4E7'
 linea = html.Hr(style={'borderWidth': '0.3vh', 'width': '100%', 'color': '#104e8b'})
 espacio = html.Br()
 
-# fecha_sel = max(ahora(), fecha_inicial)
-fecha_sel = max(dia_laboral(), fecha_inicial)
-mes_sel = fecha_sel.month
-
 
 # #### Encabezado
 # encabezado
@@ -757,6 +1765,170 @@ def tabs_visual(tab):
     ])
 
 
+#### Descargas
+# enlaces firmados a la ruta de descargas: describen la exportación (tipo, mes, temporada, usuario, formato)
+# y la ruta la escribe en un archivo temporal que se envía por partes, sin pasar por la respuesta del callback
+
+clave_secreta = os.environ.get('SECRET_KEY')
+if not clave_secreta:
+    logger.warning('SECRET_KEY no definida: la clave de firma se deriva de las credenciales de la base')
+    clave_secreta = hashlib.sha256(
+        ':'.join([objeto_url.render_as_string(hide_password=False)] + [os.environ[k] for k in sorted(os.environ) if re.fullmatch(r'U\d+', k)]).encode()
+    ).hexdigest()
+
+ttl_descarga = int(os.environ.get('TTL_DESCARGA', 43200))
+firma_descargas = URLSafeTimedSerializer(clave_secreta, salt='descargas')
+
+def url_descarga(consulta):
+    return '/descargas/' + firma_descargas.dumps(consulta)
+
+etiquetas_descarga = {'xlsx': 'Exportar a Excel', 'csv': 'CSV', 'parquet': 'Parquet'}
+
+def enlaces_descarga(id_base, consulta=None):
+    return [
+        html.A(
+            etiquetas_descarga[formato],
+            id=id_base if formato == 'xlsx' else f'{id_base}-{formato}',
+            href=url_descarga(consulta | {'formato': formato}) if consulta else None,
+            className='btn btn-outline-primary',
+            style={'width': '15%' if formato == 'xlsx' else '8%', 'marginRight': 10, 'marginTop': 15, 'padding': '6px 20px'},
+        )
+        for formato in etiquetas_descarga
+    ]
+
+# tabla que corresponde a una descarga y nombre del archivo (las visitas dependen del rol: público u organizador)
+
+rol_usuario = lambda usuario: 'publico' if usuario == 0 else 'organizador'
+
+def tabla_descarga(consulta):
+    if consulta['tipo'] == 'propuestas':
+        return tabla_propuesta(propuestas_cache()), 'propuestas'
+    if consulta['tipo'] == 'reportes':
+        return tabla_reportes(consulta['mes'], consulta['temporada'], consulta.get('organizador')), 'reportes'
+    if consulta['rol'] == 'publico':
+        return tabla_programada(consulta['mes'], 0, consulta['temporada']), 'visitas'
+    return tabla_programada_detalle(consulta['mes'], consulta['temporada']), 'visitas_detalle'
+
+
+#### Exportaciones en segundo plano
+# las exportaciones se generan en un grupo de hilos y quedan en disco, con nombre según (tipo, temporada, mes, rol,
+# formato, versión de los datos); el avance se registra en disco, de modo que cualquier worker puede informarlo
+
+dir_exportaciones = os.environ.get('DIR_EXPORTACIONES', os.path.join(tempfile.gettempdir(), 'app-visitas-exportaciones'))
+os.makedirs(dir_exportaciones, exist_ok=True)
+
+ttl_exportacion = int(os.environ.get('TTL_EXPORTACION', ttl_instantanea))
+duracion_exportaciones = int(os.environ.get('DURACION_EXPORTACIONES', 86400))
+
+ejecutor_exportaciones = ThreadPoolExecutor(max_workers=int(os.environ.get('HILOS_EXPORTACION', 2)), thread_name_prefix='exporta')
+candado_exportaciones = threading.Lock()
+en_curso = set()
+
+# versión de los datos de una exportación: las temporadas archivadas no cambian; la vigente cambia con las
+# escrituras propias y con las relecturas de las copias del worker. Con la tabla versiones las copias siguen a la
+# base y la clave se arma con sus contadores (un archivo sirve mientras los datos no cambien); sin ella, para acotar
+# las escrituras de otros workers, cambia además con cada intervalo de ttl_exportacion segundos. Las versiones
+# locales son de cada proceso: el origen evita que otro worker (o un reinicio) reutilice un archivo de
+# DIR_EXPORTACIONES generado con otros datos
+
+def version_exportacion(consulta):
+    if consulta['tipo'] == 'propuestas':
+        propuestas_cache()
+        return f"propuestas:{origen_programadas()}:{cache_propuestas['version']}"
+    if consulta['temporada'] != temporada:
+        return 'archivo'
+    asegura_instantanea()
+    local = f"{origen_programadas()}:{instantanea['version']}:{estado_asisten['version']}"
+    if vigencia['activa']:
+        return f"{local}:{instantanea['base']}:{matriz_asisten['base']}"
+    intervalo = int(reloj.time() // ttl_exportacion)
+    return f"{local}:{intervalo}"
+
+def clave_exportacion(consulta):
+    datos = {k: v for k, v in consulta.items() if k != 'clave'} | {'version': version_exportacion(consulta)}
+    return hashlib.sha1(json.dumps(datos, sort_keys=True).encode()).hexdigest()
+
+def ruta_exportacion(clave, formato, sufijo=''):
+    return os.path.join(dir_exportaciones, f'{clave}.{formato}{sufijo}')
+
+def marca_avance(clave, formato, avance):
+    with open(ruta_exportacion(clave, formato, '.avance'), 'w') as archivo:
+        archivo.write(str(avance))
+
+# escribe la exportación en un temporal del mismo directorio y lo renombra al terminar (operación atómica)
+
+def genera_exportacion(consulta, clave):
+    formato = consulta['formato']
+    try:
+        marca_avance(clave, formato, 10)
+        df, _ = tabla_descarga(consulta)
+        marca_avance(clave, formato, 60)
+        escribe, _ = formatos_descarga[formato]
+        descriptor, temporal = tempfile.mkstemp(dir=dir_exportaciones, suffix=f'.{formato}')
+        os.close(descriptor)
+        try:
+            escribe(df, temporal)
+            os.replace(temporal, ruta_exportacion(clave, formato))
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+    except Exception:
+        logger.exception('falló la exportación %s', consulta)
+        open(ruta_exportacion(clave, formato, '.error'), 'w').close()
+    finally:
+        if os.path.exists(ruta_exportacion(clave, formato, '.avance')):
+            os.remove(ruta_exportacion(clave, formato, '.avance'))
+        with candado_exportaciones:
+            en_curso.discard(clave)
+
+# borra exportaciones antiguas
+
+def limpia_exportaciones():
+    limite = reloj.time() - duracion_exportaciones
+    for nombre in os.listdir(dir_exportaciones):
+        ruta = os.path.join(dir_exportaciones, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+def encola_exportacion(consulta):
+    clave = clave_exportacion(consulta)
+    formato = consulta['formato']
+    with candado_exportaciones:
+        if not os.path.exists(ruta_exportacion(clave, formato)) and clave not in en_curso:
+            limpia_exportaciones()
+            if os.path.exists(ruta_exportacion(clave, formato, '.error')):
+                os.remove(ruta_exportacion(clave, formato, '.error'))
+            en_curso.add(clave)
+            marca_avance(clave, formato, 0)
+            ejecutor_exportaciones.submit(genera_exportacion, consulta, clave)
+    return {'clave': clave, 'formato': formato, 'url': url_descarga(consulta | {'clave': clave})}
+
+# estado de un trabajo: 'listo', 'error' o el porcentaje de avance
+
+def estado_exportacion(trabajo):
+    clave, formato = trabajo['clave'], trabajo['formato']
+    if os.path.exists(ruta_exportacion(clave, formato)):
+        return 'listo'
+    if os.path.exists(ruta_exportacion(clave, formato, '.error')):
+        return 'error'
+    try:
+        with open(ruta_exportacion(clave, formato, '.avance')) as archivo:
+            return int(archivo.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def aviso_exportacion(trabajo):
+    estado = estado_exportacion(trabajo)
+    if estado == 'listo':
+        return html.A('Descargar archivo', href=trabajo['url'], className='btn btn-primary', style={'padding': '6px 20px'})
+    if estado == 'error':
+        return html.P('No se pudo generar la exportación. Intente nuevamente.', style={'color': 'red'})
+    return dbc.Progress(value=max(estado, 5), striped=True, animated=True, label='Preparando exportación...', style={'height': '25px'})
+
+
 #### Viz colegios propuestos
 # visualización de colegios propuestos
 
@@ -777,12 +1949,10 @@ def vista_propuestos_gral(datos):
     return html.Div(
         dag.AgGrid(
             id='viz-col-prop-gral',
-            rowData=propuesta_vista(datos),
+            rowData=None if grilla_servidor else propuesta_vista(datos),
             defaultColDef={'resizable': True},
             columnDefs=columnDefs_viz_prop,
-            dashGridOptions = {
-                'rowSelection': 'single',
-            },
+            dashGridOptions=opciones_grilla(),
             columnSize='sizeToFit',
             getRowStyle=getRowStyle,
             style={'height': '800px', 'width': '1000px'}
@@ -790,20 +1960,17 @@ def vista_propuestos_gral(datos):
     )
 
 # botón que exporta selección a excel
-btn_exp_prop = html.Div(
-    dbc.Row([
-        html.Button('Exportar a Excel', id='exporta-prop', className='btn btn-outline-primary',
-                    style={'width': '15%', 'marginRight': 10, 'marginTop': 15, 'padding': '6px 20px'}),
-        dcc.Download(id='exporta-prop-archivo'),
-    ], justify='end',)
-)
+def btn_exp_prop():
+    return html.Div(
+        dbc.Row(enlaces_descarga('exporta-prop', {'tipo': 'propuestas'}), justify='end',)
+    )
 
 
 def form_vista_propuestos_gral(datos):
     return dbc.Form([
         html.H3(['Colegios propuestos por universidad'], style={'marginLeft': 15, 'marginBottom': 12, 'marginTop': 10}),
         vista_propuestos_gral(datos),
-        btn_exp_prop,
+        btn_exp_prop(),
     ], id='form-viz-col-prop-gral')
 
 
@@ -812,14 +1979,29 @@ def form_vista_propuestos_gral(datos):
 
 op_meses = opciones_meses()
 
-def botones_mes(mes):
+op_temporadas = [{'label': str(anio), 'value': anio} for anio in temporadas]
+
+def botones_mes(mes, anio=temporada):
     return html.Div([
         dbc.Row([
+            html.H5('Temporada:', style={'width': '10%', 'display': 'flex'}),
+            dcc.Dropdown(
+                op_temporadas,
+                id = 'selec-temporada',
+                value = anio,
+                clearable = False,
+                persistence = True,
+                persistence_type = 'memory',
+                disabled = len(temporadas) == 1,
+                style = {'width': '110px', 'marginRight': '20px'},
+            ),
             html.H5('Filtro según mes:', style={'width': '14%', 'display': 'flex'}),
             dcc.RadioItems(
                 id = 'selec-mes',
                 options = op_meses,
                 value = mes,
+                persistence = True,
+                persistence_type = 'memory',
                 style = {'textAlign': 'left', 'width': '50%', 'display': 'flex', 'marginTop': '3px'},
                 labelStyle = {'display': 'inline-block', 'fontSize': '14px', 'fontWeight': 'normal'},
                 inputStyle = {'marginRight': '5px', 'marginLeft': '20px'},
@@ -837,15 +2019,13 @@ columnDefs = [
     {'field': 'estatus', 'filter': True, 'sortable': True},
 ]
 
-def grid_programadas(datos, mes):
+def grid_programadas(mes, anio=temporada):
     return dag.AgGrid(
         id='viz-ferias',
-        rowData=programadas_vista(datos, mes),
+        rowData=None if grilla_servidor else programadas_vista(mes, anio),
         defaultColDef={'resizable': True},
         columnDefs=columnDefs,
-        dashGridOptions = {
-            'rowSelection': 'single',
-        },
+        dashGridOptions=opciones_grilla(),
         columnSize='sizeToFit',
         getRowStyle=getRowStyle,
         style={'height': '800px', 'width': 1250}
@@ -853,11 +2033,32 @@ def grid_programadas(datos, mes):
 
 # botón que exporta selección a excel
 
-btn_exp_visitas = dbc.Row([
-    html.Button('Exportar a Excel', id='exporta-visitas', className='btn btn-outline-primary',
-                style={'width': '15%', 'marginRight': 10, 'marginTop': 15, 'padding': '6px 20px'}),
-    dcc.Download(id='exporta-visitas-archivo'),
-], justify='end',)
+btn_exp_visitas = html.Div([
+    dbc.Row([
+        html.Button(
+            etiquetas_descarga[formato],
+            id='exporta-visitas' if formato == 'xlsx' else f'exporta-visitas-{formato}',
+            className='btn btn-outline-primary',
+            style={'width': '15%' if formato == 'xlsx' else '8%', 'marginRight': 10, 'marginTop': 15, 'padding': '6px 20px'},
+        )
+        for formato in etiquetas_descarga
+    ], justify='end',),
+    dbc.Row([
+        dcc.Dropdown(
+            opciones(universidades),
+            id='reportes-organizador',
+            placeholder='Reportes de todas las instituciones',
+            style={'width': '380px', 'marginRight': 10, 'marginTop': 8},
+        ),
+        html.Button('Reportes PDF', id='exporta-reportes-pdf', className='btn btn-outline-primary',
+                    style={'width': '12%', 'marginRight': 10, 'marginTop': 8, 'padding': '6px 20px'}),
+        html.Button('Reportes ZIP', id='exporta-reportes-zip', className='btn btn-outline-primary',
+                    style={'width': '12%', 'marginRight': 10, 'marginTop': 8, 'padding': '6px 20px'}),
+    ], justify='end',),
+    dbc.Row(html.Div(id='estado-exportacion', style={'width': '31%', 'marginRight': 10, 'marginTop': 10}), justify='end'),
+    dcc.Store(id='trabajo-exportacion'),
+    dcc.Interval(id='avance-exportacion', interval=1000, disabled=True),
+])
 
 # modal con la información de la visita
 
@@ -882,13 +2083,15 @@ reporte_programada = html.Div(
 )
 
 # forma
-def form_visualiza(datos, mes):
+def form_visualiza(mes, anio=temporada):
     return dbc.Form([
         html.H3(['Visitas Programadas'], style={'marginLeft': 15, 'marginBottom': 12, 'marginTop': 10}),
-        html.Div(botones_mes(mes)),
-        html.Div(grid_programadas(datos, mes)),
+        html.Div(botones_mes(mes, anio)),
+        html.Div(grid_programadas(mes, anio)),
         html.Div(reporte_programada),
         html.Div(btn_exp_visitas),
+        dcc.Store(id='consulta-temporada'),
+        dcc.Store(id='visita-reporte'),
     ], id='form-visualiza')
 
 
@@ -1065,8 +2268,9 @@ def colegio2():
         ], style={'display': 'inline-block', 'vertical-align': 'top', 'width': '15%'}),
         dbc.Col([
             html.H5('Según nombre'),
-            dcc.Dropdown(op_colegios, id='in-nom-prop', placeholder='Seleccione de la lista / Ingrese palabra(s) del nombre', style={'width': '98%'},
+            dcc.Dropdown([], id='in-nom-prop', placeholder='Ingrese palabra(s) del nombre o el RBD', style={'width': '98%'},
                         persistence=True, persistence_type='memory'),
+            dcc.Store(id='busca-nom-prop'),
         ], style={'display': 'inline-block', 'vertical-align': 'top', 'width': '65%'}),
         dbc.Row([
             html.Button('Limpiar selección', id='btn-limpia-prop', n_clicks=0, className='btn btn-outline-primary', style={'display': 'inline-block', 'width': '16%', 'marginLeft': 15}),
@@ -1097,9 +2301,13 @@ def form_colegios_prop(datos, usuario):
 #### Ingresa
 
 op_horas = opciones({'00:00:00': 'En blanco'} | horas_15)
-op_colegios = opciones(colegios)
 op_comunas = opciones(comunas)
 
+@referencias.al_recargar
+def actualiza_opciones():
+    op_horas[:] = opciones({'00:00:00': 'En blanco'} | horas_15)
+    op_comunas[:] = opciones(comunas)
+
 # forma de pestaña de agregar visita
 # selector de fecha de nueva visita
 columnDefs_ing = [
@@ -1111,17 +2319,18 @@ columnDefs_ing = [
 ]
 
 def fecha_visita():
+    dia = calendario.dia_laboral()
     return html.Div([
         dbc.Col([
             html.H5('Seleccione una fecha:'),
             dcc.DatePickerSingle(
                 id='sel-fecha',
-                min_date_allowed=dia_laboral(),
+                min_date_allowed=dia,
                 max_date_allowed=fecha_final,
-                disabled_days=feriados,
+                disabled_days=calendario.no_laborales(dia),
                 first_day_of_week=1,
-                initial_visible_month=str(mes_sel),
-                date=dia_laboral(),
+                initial_visible_month=dia,
+                date=dia,
                 display_format='D MMM YYYY',
                 stay_open_on_select=False, # MANTIENE ABIERTO EL SELECTOR DE FECHA
                 show_outside_days=False,
@@ -1157,8 +2366,9 @@ def colegio():
         ], style={'display': 'inline-block', 'vertical-align': 'top', 'width': '15%'}),
         dbc.Col([
             html.H5('Según nombre'),
-            dcc.Dropdown(op_colegios, id='sel-nombre', placeholder='Seleccione de la lista / Ingrese palabra(s) del nombre', style={'width': '98%'},
+            dcc.Dropdown([], id='sel-nombre', placeholder='Ingrese palabra(s) del nombre o el RBD', style={'width': '98%'},
                         persistence=True, persistence_type='memory'),
+            dcc.Store(id='busca-nombre'),
         ], style={'display': 'inline-block', 'vertical-align': 'top', 'width': '65%'}),
         dbc.Row([
             html.Button('Limpiar selección', id='limpiar-sel', n_clicks=0, className='btn btn-outline-primary', style={'width': '16%', 'marginLeft': 15}),
@@ -1235,11 +2445,12 @@ def estatus():
     ])
 
 
-acepta = html.Div([
-    html.Button('Agregar visita', id='ag-visita', n_clicks=0, className='btn btn-outline-primary', style={'width': '16%', 'marginLeft': 15},
-#                 disabled=chk_bloqueado(dia_laboral(), bloqueados_local)),
-                 disabled=chk_bloqueado(dia_laboral(), verifica_bloqueados)),
-])
+def acepta():
+    return html.Div([
+        html.Button('Agregar visita', id='ag-visita', n_clicks=0, className='btn btn-outline-primary', style={'width': '16%', 'marginLeft': 15},
+#                     disabled=chk_bloqueado(dia_laboral(), bloqueados_local)),
+                     disabled=chk_bloqueado(calendario.dia_laboral(), bloqueadas_cache)),
+    ])
 
 # modal que informa que fecha no está disponible
 fecha_no_disponible = html.Div(
@@ -1271,7 +2482,7 @@ def form_agrega():
         linea,
         estatus(),
         linea,
-        acepta,
+        acepta(),
         linea,
         fecha_no_disponible,
     ], style={'marginTop': 0, 'padding': '10px'})
@@ -1287,12 +2498,12 @@ columnDefs_mod = [
     {'field': 'fecha', 'cellStyle': {'textAlign': 'center'}},
 ]
 
-def viz_modifica(datos, usuario):
+def viz_modifica(usuario):
     return html.Div([
         dbc.Col([
             dag.AgGrid(
                 id='ferias-prg-usr',
-                rowData=programadas_usuario(datos, usuario, ahora()),
+                rowData=programadas_usuario(usuario, ahora()),
                 defaultColDef={'resizable': True},
                 columnDefs=columnDefs_mod,
                 columnSize='sizeToFit',
@@ -1313,11 +2524,11 @@ botones_modifica = html.Div([
     ], style={'width': '15%', 'display': 'inline-block', 'vertical-align': 'center'}
 )
 
-def form_modifica(datos, usuario):
+def form_modifica(usuario):
     return dbc.Form([
         html.H5(['Seleccione la visita que desea modificar o eliminar:'], style={'marginLeft': 15, 'marginTop': 20}),
         dbc.Row([
-            html.Div(viz_modifica(datos, usuario), style={'width': 'auto', 'display': 'inline-block', 'vertical-align': 'top'}),
+            html.Div(viz_modifica(usuario), style={'width': 'auto', 'display': 'inline-block', 'vertical-align': 'top'}),
             botones_modifica,
         ])
     ], id='form-modifica')
@@ -1364,16 +2575,17 @@ def mod_direccion(direccion, comuna):
 
 
 # fecha: cambiar la fecha debiera ser equivalente a crear una nueva visita
-def mod_fecha(datos, fecha):
+def mod_fecha(fecha):
+    dia = calendario.dia_laboral()
     return html.Div(
         dbc.Row([
             dbc.Col([
                 html.H5(['Fecha:']),
                 dcc.DatePickerSingle(
                     id='mod-fecha',
-                    min_date_allowed=dia_laboral(),
+                    min_date_allowed=dia,
                     max_date_allowed=fecha_final,
-                    disabled_days=feriados,
+                    disabled_days=calendario.no_laborales(dia),
                     first_day_of_week=1,
                     initial_visible_month=str(fecha.month),
                     date=fecha,
@@ -1387,7 +2599,7 @@ def mod_fecha(datos, fecha):
                 html.H5('Visitas programadas para dicha fecha'),
                 dag.AgGrid(
                     id='mod-ferias-prg',
-                    rowData=programadas_fecha(datos, fecha),
+                    rowData=programadas_fecha(fecha),
                     defaultColDef={'resizable': True},
                     columnDefs=columnDefs_ing,
                     columnSize='sizeToFit',
@@ -1492,7 +2704,7 @@ fecha_no_disponible2 = html.Div(
     )
 )
 
-def form_modifica_visita(datos, original):
+def form_modifica_visita(original):
     return dbc.Form([
         html.H5(['Modificación de datos de visita'], style={'marginLeft': 15, 'marginTop': 20}),
         linea,
@@ -1502,7 +2714,7 @@ def form_modifica_visita(datos, original):
         linea,
         mod_direccion(original['direccion'], original['comuna_id']),
         linea,
-        mod_fecha(datos, original['fecha']),
+        mod_fecha(original['fecha']),
         linea,
         mod_horario(original['hora_ini'], original['hora_fin'], original['hora_ins']),
         linea,
@@ -1560,7 +2772,7 @@ def form_ingreso(usuario):
 def form_footer():
     return html.Div(
         html.Footer(
-            ['2025:  Corporación de Universidades Privadas'],
+            [f'{temporada}:  Corporación de Universidades Privadas'],
             style={
                 'display': 'flex',
                 'background': color,
@@ -1575,47 +2787,209 @@ def form_footer():
 
 parametros_iniciales = {
     'user': usuario,
-    'mes': -1,
-    'fecha_ori': fecha_inicial,
+    'fecha_ori': fecha_inicial.isoformat(),
     'tab_visual': 'tabviz2',
     'tab_edit': 'tab-ed2',
-    'rbd_propuesta': None,
     'id_modifica': None,
 }
 
+# claves que vuelven a su valor inicial al cargar la página (las demás las comparten las pestañas del navegador)
+claves_vista = ('tab_visual', 'tab_edit')
+
+# sesión de un usuario acreditado: los callbacks que escriben no se ejecutan sin ingreso (p. ej. sesión vencida)
+def sesion_acreditada():
+    param = sesiones.actual()
+    if param['user'] == 0:
+        raise PreventUpdate
+    return param
+
 
 #### Layout
 
-app = DashProxy(__name__, transforms=[MultiplexerTransform()], external_stylesheets=[dbc.themes.CERULEAN])
+# las salidas que escriben varios callbacks se declaran con allow_duplicate (el primero que las escribe las crea;
+# los demás no se disparan al inicio)
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CERULEAN])
 
 app.config.suppress_callback_exceptions = True
 
-# layout de la aplicación
+# layout de la aplicación (usa las instantáneas: solo consulta los contadores de versiones de la base)
 def serve_layout():
+    referencias.vigila()
+    verifica_versiones()
+    paquete = paquete_programadas()
+    acreditado = sesiones.actual()['user'] if has_request_context() else usuario
     return dbc.Container([
         encabezado,
-        html.Div(usuario_actual(usuario), id='contenido-usuario'),
-        tabs_inicio(usuario),
+        html.Div(usuario_actual(acreditado), id='contenido-usuario'),
+        tabs_inicio(acreditado),
         form_footer(),
 
-        dcc.Store(id='datos-programadas', data=lectura('programadas')[0]),
-        dcc.Store(id='datos-propuestas', data=lectura('propuestas')[0]),
-        dcc.Store(id='parametros', data=parametros_iniciales),
+        dcc.Store(id='datos-programadas', data=paquete),
+        dcc.Store(id='version-programadas', data={'origen': paquete['origen'], 'version': paquete['version']}),
+        dcc.Store(id='cambios-programadas'),
+        dcc.Store(id='recarga-programadas'),
+        dcc.Store(id='datos-propuestas', data=propuestas_cache()),
+        dcc.Store(id='temporada-vigente', data=temporada),
     ])
 
 app.layout = serve_layout
 
 server = app.server
 
+# instrumentación opcional de callbacks y consultas (METRICAS=1): va primero para medir el pedido completo
+metricas.instala(app, engine)
+
+# estado de navegación en sesiones del servidor (módulo sesiones); cargar la página conserva la sesión vigente y
+# reinicia las claves de la vista
+sesiones.instala(server, clave_secreta, parametros_iniciales)
+
+# ETag del layout: cambia solo con las versiones de las instantáneas, de modo que un cliente
+# que vuelve con datos vigentes recibe 304 sin que se construya el layout
+
+ruta_layout = app.config.routes_pathname_prefix + '_dash-layout'
+
+def etag_layout():
+    referencias.vigila()
+    asegura_instantanea()
+    propuestas_cache()
+    clave = f"{origen_programadas()}:{instantanea['version']}:{cache_propuestas['version']}:{referencias.estado['version']}:{sesiones.actual()['user']}"
+    return hashlib.sha1(clave.encode()).hexdigest()
+
+# (la etiqueta se calcula antes de construir el layout, para no rotular datos más nuevos que los enviados)
+@server.before_request
+def layout_no_modificado():
+    if request.path == ruta_layout:
+        sesiones.reinicia(claves_vista)
+        g.etag_layout = etag_layout()
+        if request.if_none_match.contains(g.etag_layout):
+            return Response(status=304, headers={'ETag': f'"{g.etag_layout}"', 'Cache-Control': 'no-cache'})
+
+@server.after_request
+def etiqueta_layout(respuesta):
+    if request.path == ruta_layout and respuesta.status_code == 200:
+        respuesta.set_etag(g.etag_layout)
+        respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+# grabación del tráfico de callbacks para la prueba de carga (scripts/carga_callbacks.py): con GRABA_CALLBACKS=ruta
+# cada pedido a _dash-update-component se agrega como una línea JSON; el ingreso no se graba (lleva la contraseña)
+
+ruta_grabacion = os.environ.get('GRABA_CALLBACKS')
+ruta_callbacks = app.config.routes_pathname_prefix + '_dash-update-component'
+candado_grabacion = threading.Lock()
+
+if ruta_grabacion:
+    @server.before_request
+    def graba_callback():
+        if request.path != ruta_callbacks:
+            return
+        cuerpo = request.get_json(silent=True)
+        if not cuerpo or any(isinstance(e, dict) and e.get('id') == 'ingreso-pw' for e in cuerpo.get('state', [])):
+            return
+        with candado_grabacion, open(ruta_grabacion, 'a') as archivo:
+            archivo.write(json.dumps(cuerpo, ensure_ascii=False) + '\n')
+
+# tabla de colegios para el navegador (assets/colegios.js): arreglos paralelos rbd, nombre y comuna; el cuerpo y su
+# etiqueta se preparan en cada recarga de los datos de referencia y el navegador la revalida con If-None-Match
+
+tabla_colegios = {}
+
+@referencias.al_recargar
+def prepara_tabla_colegios():
+    cuerpo = json.dumps({
+        'rbd': list(colegios),
+        'nombre': list(colegios.values()),
+        'comuna': [colegios_comuna.get(rbd) for rbd in colegios],
+    }, ensure_ascii=False, separators=(',', ':')).encode()
+    marcas = json.dumps(referencias.estado['mtimes'], sort_keys=True)
+    tabla_colegios.update(cuerpo=cuerpo, etag=hashlib.sha1(marcas.encode() + cuerpo).hexdigest())
+
+prepara_tabla_colegios()
+
+@server.route('/referencias/colegios.json')
+def referencias_colegios():
+    referencias.vigila()
+    cuerpo, etag = tabla_colegios['cuerpo'], tabla_colegios['etag']
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+    respuesta = Response(cuerpo, mimetype='application/json')
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+# estado del pool de conexiones del worker
+@server.route('/estado/pool')
+def estado_pool():
+    return reporte_pool()
+
+# duración del arranque en frío del worker
+@server.route('/estado/arranque')
+def estado_arranque():
+    return {'pid': os.getpid(), 'arranque_ms': 1000 * tiempo_arranque}
+
+# consistencia de la matriz de asistencia con la tabla asisten (?corrige=1 la relee si difieren). Lee la
+# temporada completa: solo responde si está definida TOKEN_ESTADO y el pedido la trae (?token= o Authorization: Bearer)
+
+token_estado = os.environ.get('TOKEN_ESTADO')
+
+def autoriza_estado():
+    if not token_estado:
+        abort(404)
+    enviado = request.args.get('token') or request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(enviado.encode(), token_estado.encode()):
+        abort(403)
+
+@server.route('/estado/asistencia')
+def estado_asistencia():
+    autoriza_estado()
+    diferencias = verifica_matriz()
+    if diferencias['faltan'] or diferencias['sobran'] or diferencias['difieren']:
+        logger.warning('la matriz de asistencia difiere de la tabla asisten: %s', diferencias)
+        if request.args.get('corrige') == '1':
+            recarga_matriz()
+    asisten = {str(organizador_id): n for organizador_id, n in conteo_asisten().items()}
+    return {'pid': os.getpid(), 'asisten': asisten} | diferencias
+
+# descarga de exportaciones: se envía por partes el archivo en caché (si no existe, se genera en el pedido).
+# El detalle de visitas (con teléfonos y correos de contacto) exige además una sesión de organizador: el enlace
+# firmado queda en los registros de acceso y por sí solo no basta
+@server.route('/descargas/<token>')
+def descarga(token):
+    try:
+        consulta = firma_descargas.loads(token, max_age=ttl_descarga)
+    except BadSignature:
+        abort(404)
+    if consulta.get('formato') not in formatos_descarga:
+        abort(404)
+    if consulta.get('rol') == 'organizador' and rol_usuario(sesiones.actual()['user']) != 'organizador':
+        abort(403)
+
+    formato = consulta['formato']
+    clave = consulta.get('clave') or clave_exportacion(consulta)
+    if not os.path.exists(ruta_exportacion(clave, formato)):
+        genera_exportacion(consulta, clave)
+    if not os.path.exists(ruta_exportacion(clave, formato)):
+        abort(500)
+
+    if consulta['tipo'] == 'visitas':
+        nombre = {'publico': 'visitas'}.get(consulta['rol'], 'visitas_detalle')
+    else:
+        nombre = consulta['tipo']
+    return send_file(
+        ruta_exportacion(clave, formato),
+        mimetype=formatos_descarga[formato][1],
+        as_attachment=True,
+        download_name=f'{nombre}.{formato}',
+    )
+
 # CALLBACK
 # TAB: ventana inicial
 @app.callback(
     Output('contenido-inicio', 'children'),
     Input('tabs-inicio', 'value'),
-    State('datos-programadas', 'data'),
-    State('parametros', 'data'),
 )
-def crea_contenido_inicio(tab, datos, param):
+def crea_contenido_inicio(tab):
+    param = sesiones.actual()
     usuario = param['user']
     if tab == 'tab-in1':
         return tabs_visual(param['tab_visual'])
@@ -1628,160 +3002,207 @@ def crea_contenido_inicio(tab, datos, param):
 
 # BOTON: ingreso como usuario / acceso a edición
 @app.callback(
-    Output('contenido-inicio', 'children'),
+    Output('contenido-inicio', 'children', allow_duplicate=True),
     Output('contenido-usuario', 'children'),
-    Output('parametros', 'data'),  # cambio del id del usuario
     Output('ingreso-pw', 'value'),
     Output('tab02', 'label'),
     Input('boton-ingresar', 'n_clicks'),
     State('ingreso-univ', 'value'),
     State('ingreso-pw', 'value'),
-    State('parametros', 'data'),
+    prevent_initial_call=True,
 )
-def ingreso_edicion(click, universidad, pw, param):
+def ingreso_edicion(click, universidad, pw):
     if click == 0:
         raise PreventUpdate
     else:
         if (universidad != None) & (pw != None) & (pw != ''):
             if os.environ[f'U{universidad}'] == pw:
+                param = sesiones.actual()
                 param['user'] = universidad
-                return html.Div([contenido_edicion(param['tab_edit'])]), usuario_actual(universidad), param, pw, label_pestana(universidad)
+                return html.Div([contenido_edicion(param['tab_edit'])]), usuario_actual(universidad), pw, label_pestana(universidad)
             else:
-                return dash.no_update, dash.no_update, dash.no_update, None, dash.no_update
+                return dash.no_update, dash.no_update, None, dash.no_update
         else:
-            return dash.no_update, dash.no_update, dash.no_update, None, dash.no_update
+            return dash.no_update, dash.no_update, None, dash.no_update
 
 
 # 3.1 despliegue de las opciones de visualización
 @app.callback(
     Output('contenido-visual', 'children'),
-    Output('parametros', 'data'),
     Input('tabs-visual', 'value'),
-    State('datos-programadas', 'data'),
     State('datos-propuestas', 'data'),
-    State('parametros', 'data'),
 )
-def crea_contenido_visualizacion(tab, datos, datos_prop, param):
-    if param['mes'] == -1:
-        param['mes'] = max(dia_laboral(), fecha_inicial).month
+def crea_contenido_visualizacion(tab, datos_prop):
+    param = sesiones.actual()
     if tab == 'tabviz1':
         param['tab_visual'] = tab
-        return html.Div(form_vista_propuestos_gral(datos_prop)), param  # <= ***
+        return html.Div(form_vista_propuestos_gral(datos_prop))  # <= ***
     elif tab == 'tabviz2':
         param['tab_visual'] = tab
-        return html.Div(form_visualiza(datos, param['mes'])), param
+        # el mes y la temporada elegidos se conservan en el navegador (persistence de los selectores)
+        return html.Div(form_visualiza(max(calendario.dia_laboral(), fecha_inicial).month))
 
 
 # 3.2 despliegue de las opciones de edición
 @app.callback(
     Output('contenido-edicion', 'children'),
-    Output('parametros', 'data'),
     Input('tabs-edicion', 'value'),
-    State('datos-programadas', 'data'),
     State('datos-propuestas', 'data'),
-    State('parametros', 'data'),
 )
-def crea_contenido_edicion(tab, datos, datos_prop, param):
+def crea_contenido_edicion(tab, datos_prop):
+    param = sesiones.actual()
     if tab == 'tab-ed1':
         param['tab_edit'] = tab
-        return form_colegios_prop(datos_prop, param['user']), param
+        return form_colegios_prop(datos_prop, param['user'])
     elif tab == 'tab-ed2':
         param['tab_edit'] = tab
-        return form_agrega(), param
+        return form_agrega()
     elif tab == 'tab-ed3':
         param['tab_edit'] = tab
-        return form_modifica(datos, param['user']), param
+        return form_modifica(param['user'])
+
+
+# RADIO: modifica la visualización de las visitas programadas (mes y temporada); la temporada vigente se filtra en
+# el navegador sobre el store datos-programadas (assets/programadas.js), las anteriores se piden al servidor
+if not grilla_servidor:
+    app.clientside_callback(
+        ClientsideFunction(namespace='programadas', function_name='filtra'),
+        Output('viz-ferias', 'rowData', allow_duplicate=True),
+        Output('consulta-temporada', 'data'),
+        Input('selec-mes', 'value'),
+        Input('selec-temporada', 'value'),
+        State('datos-programadas', 'data'),
+        State('temporada-vigente', 'data'),
+        prevent_initial_call='initial_duplicate',
+    )
+
+
+@app.callback(
+    Output('viz-ferias', 'rowData', allow_duplicate=True),
+    Input('consulta-temporada', 'data'),
+    prevent_initial_call=True,
+)
+def filas_temporada(consulta):
+    return programadas_vista(consulta['mes'], temporada_pedida(consulta['temporada']))
+
+
+# GRILLAS: ventanas de filas para el modelo infinito (MODELO_GRILLA=servidor)
+@app.callback(
+    Output('viz-ferias', 'getRowsResponse'),
+    Input('viz-ferias', 'getRowsRequest'),
+    State('selec-mes', 'value'),
+    State('selec-temporada', 'value'),
+    prevent_initial_call=True,
+)
+def filas_programadas(solicitud, mes, anio):
+    if not solicitud:
+        raise PreventUpdate
+    return ventana_filas(programadas_mes(mes or 0, temporada_pedida(anio)), solicitud, campos_grilla(columnDefs))
 
 
-# RADIO: modifica la visualización de las visitas programadas
 @app.callback(
-    Output('parametros', 'data'),
-    Output('viz-ferias', 'rowData'),
+    Output('viz-col-prop-gral', 'getRowsResponse'),
+    Input('viz-col-prop-gral', 'getRowsRequest'),
+    prevent_initial_call=True,
+)
+def filas_propuestas(solicitud):
+    if not solicitud:
+        raise PreventUpdate
+    return ventana_filas(propuestas_gral(propuestas_cache()), solicitud, campos_grilla(columnDefs_viz_prop))
+
+
+# al cambiar el mes, la grilla infinita descarta sus bloques y vuelve a pedir filas desde el inicio
+app.clientside_callback(
+    ClientsideFunction(namespace='grillas', function_name='reinicia'),
+    Output('viz-ferias', 'scrollTo'),
     Input('selec-mes', 'value'),
-    State('datos-programadas', 'data'),
-    State('parametros', 'data'),
+    Input('selec-temporada', 'value'),
     prevent_initial_call=True,
 )
-def mod_visualizacion_mes(mes, datos, param):
-    param['mes'] = mes
-    return param, programadas_vista(datos, mes)
 
 
 # cambio de día
 @app.callback(
     Output('ferias-prg', 'rowData'),
     Input('sel-fecha', 'date'),
-    State('datos-programadas', 'data'),
 )
-def ferias_programadas_fecha(fecha, datos):
-    return programadas_fecha(datos, datetime.strptime(fecha, '%Y-%m-%d').date())
+def ferias_programadas_fecha(fecha):
+    return programadas_fecha(datetime.strptime(fecha, '%Y-%m-%d').date())
+
+
+# búsqueda de colegios: el texto ingresado llega al servidor cuando el usuario deja de escribir
+app.clientside_callback(
+    ClientsideFunction(namespace='colegios', function_name='espera'),
+    Output('busca-nombre', 'data'),
+    Input('sel-nombre', 'search_value'),
+    prevent_initial_call=True,
+)
 
 
-# sleccición de RBD y nombre
 @app.callback(
+    Output('sel-nombre', 'options'),
+    Input('busca-nombre', 'data'),
+    State('sel-nombre', 'value'),
+)
+def opciones_sel_nombre(texto, valor):
+    return opciones_colegio(texto, valor)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='colegios', function_name='espera'),
+    Output('busca-nom-prop', 'data'),
+    Input('in-nom-prop', 'search_value'),
+    prevent_initial_call=True,
+)
+
+
+@app.callback(
+    Output('in-nom-prop', 'options'),
+    Input('busca-nom-prop', 'data'),
+    State('in-nom-prop', 'value'),
+)
+def opciones_nom_prop(texto, valor):
+    return opciones_colegio(texto, valor)
+
+
+# sleccición de RBD y nombre (y comuna del colegio): se resuelve en el navegador con las tablas de
+# /referencias/colegios.json (assets/colegios.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='colegios', function_name='completa'),
     Output('sel-rbd', 'value'),
     Output('sel-nombre', 'value'),
     Output('id-comuna', 'value'),
+    Output('sel-nombre', 'options', allow_duplicate=True),
     Input('sel-rbd', 'value'),
     Input('sel-nombre', 'value'),
     Input('limpiar-sel', 'n_clicks'),
     prevent_initial_call=True,
 )
-def completa_rbd_y_nombre(rbd, nombre, click):
-
-    disparador = dash.ctx.triggered_id
-
-    if disparador == 'sel-rbd':
-        try:
-            return dash.no_update, rbd, colegios_comuna[rbd]
-        except:
-            return None, dash.no_update, dash.no_update
-    elif disparador == 'sel-nombre':
-        return nombre, dash.no_update, colegios_comuna[nombre]
-    elif disparador == 'limpiar-sel':
-        return None, None, None
 
 
 # sleccición de RBD y nombre en página de colegios propuestos
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='colegios', function_name='completa_propuesta'),
     Output('in-rbd-prop', 'value'),
     Output('in-nom-prop', 'value'),
-    Output('parametros',  'data'),
+    Output('in-nom-prop', 'options', allow_duplicate=True),
     Input('in-rbd-prop', 'value'),
     Input('in-nom-prop', 'value'),
     Input('btn-limpia-prop', 'n_clicks'),
-    State('parametros',  'data'),
     prevent_initial_call=True,
 )
-def completa_rbd_y_nombre2(rbd, nombre, click, param):
-
-    disparador = dash.ctx.triggered_id
-
-    if disparador == 'in-rbd-prop':
-        try:
-            param['rbd_propuesta'] = rbd
-            return dash.no_update, rbd, param
-        except:
-            param['rbd_propuesta'] = None
-            return None, dash.no_update, param
-    elif disparador == 'in-nom-prop':
-        param['rbd_propuesta'] = nombre
-        return nombre, dash.no_update, param
-    elif disparador == 'btn-limpia-prop':
-        param['rbd_propuesta'] = None
-        return None, None, param
 
 # ====================================================================
 
 # añade visita a base de datos / faltan observaciones
 @app.callback(
     Output('modal-fecha-no-disponible', 'is_open'),  # modal con advertencia que no es posible agregar visita
-    Output('datos-programadas', 'data'),
-    Output('contenido-edicion', 'children'),
-    Output('sel-rbd', 'value'),
-    Output('sel-nombre', 'value'),
+    Output('cambios-programadas', 'data'),
+    Output('contenido-edicion', 'children', allow_duplicate=True),
+    Output('sel-rbd', 'value', allow_duplicate=True),
+    Output('sel-nombre', 'value', allow_duplicate=True),
     Output('id-direccion', 'value'),
-    Output('id-comuna', 'value'),
+    Output('id-comuna', 'value', allow_duplicate=True),
     Output('hr-inicio', 'value'),
     Output('hr-termino', 'value'),
     Output('hr-instala', 'value'),
@@ -1796,9 +3217,7 @@ def completa_rbd_y_nombre2(rbd, nombre, click, param):
     Output('obs-texto', 'value'),
 
     Input('ag-visita', 'n_clicks'),
-    Input('cerrar-fecha-no-disponible', 'n_clicks'),  # botón que cierra modal
 
-    State('parametros', 'data'),    # id usuario
     State('sel-fecha', 'date'),     # fecha
     State('sel-rbd', 'value'),      # rbd
     State('id-direccion', 'value'), # dirección
@@ -1815,64 +3234,63 @@ def completa_rbd_y_nombre2(rbd, nombre, click, param):
     State('orienta-mail', 'value'),
     State('def-estatus', 'value'),  # estatus
     State('obs-texto', 'value'),    # observaciones
+    State('version-programadas', 'data'),
     prevent_initial_call=True,
 )
-def agrega_feria(click, click2, param, fecha_str, rbd, direc, comuna, hr_ini, hr_fin, hr_ins, ct, ct_tel, ct_mail, ct_cargo, ori, ori_tel, ori_mail, est, obs):
+def agrega_feria(click, fecha_str, rbd, direc, comuna, hr_ini, hr_fin, hr_ins, ct, ct_tel, ct_mail, ct_cargo, ori, ori_tel, ori_mail, est, obs, cliente):
     if click == 0:
         raise PreventUpdate
     else:
-        disparador = dash.ctx.triggered_id
-
-        if disparador == 'cerrar-fecha-no-disponible':
-            return False, dash.no_update, dash.no_update, *[dash.no_update]*16
-
-        elif disparador == 'ag-visita':
-            fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-            if chk_bloqueado(fecha, verifica_bloqueados):
+        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+        if chk_bloqueado(fecha, bloqueadas_cache):
+            return True, dash.no_update, dash.no_update, *[dash.no_update]*16
+        else:
+            dic_datos = {}
+
+            usuario = sesion_acreditada()['user']
+            dic_datos['organizador_id'] = usuario
+            dic_datos['organizador'] = universidades[usuario]
+            dic_datos['fecha'] = fecha
+            dic_datos['rbd'] = rbd
+            dic_datos['nombre'] = colegios[rbd]
+            dic_datos['direccion'] = direc
+            dic_datos['comuna_id'] = comuna
+            dic_datos['hora_ini'] = convierte_hora(hr_ini)
+            dic_datos['hora_fin'] = convierte_hora(hr_fin)
+            dic_datos['hora_ins'] = convierte_hora(hr_ins)
+            dic_datos['contacto'] = ct
+            dic_datos['contacto_tel'] = ct_tel
+            dic_datos['contacto_mail'] = ct_mail
+            dic_datos['contacto_cargo'] = ct_cargo
+            dic_datos['orientador'] = ori
+            dic_datos['orientador_tel'] = ori_tel
+            dic_datos['orientador_mail'] = ori_mail
+            dic_datos['estatus'] = est
+            dic_datos['observaciones'] = obs
+
+            if isinstance(nueva_programada(dic_datos), FechaLlena):
                 return True, dash.no_update, dash.no_update, *[dash.no_update]*16
-            else:
-                dic_datos = {}
-
-                dic_datos['organizador_id'] = param['user']
-                dic_datos['organizador'] = universidades[param['user']]
-                dic_datos['fecha'] = fecha
-                dic_datos['rbd'] = rbd
-                dic_datos['nombre'] = colegios[rbd]
-                dic_datos['direccion'] = direc
-                dic_datos['comuna_id'] = comuna
-                dic_datos['hora_ini'] = convierte_hora(hr_ini)
-                dic_datos['hora_fin'] = convierte_hora(hr_fin)
-                dic_datos['hora_ins'] = convierte_hora(hr_ins)
-                dic_datos['contacto'] = ct
-                dic_datos['contacto_tel'] = ct_tel
-                dic_datos['contacto_mail'] = ct_mail
-                dic_datos['contacto_cargo'] = ct_cargo
-                dic_datos['orientador'] = ori
-                dic_datos['orientador_tel'] = ori_tel
-                dic_datos['orientador_mail'] = ori_mail
-                dic_datos['estatus'] = est
-                dic_datos['observaciones'] = obs
-
-                nuevos_datos = nueva_programada(dic_datos)
-
-                return False, nuevos_datos, form_agrega(), *[None]*15, ''
+
+            return False, cambios_cliente(cliente), form_agrega(), *[None]*15, ''
 
 # ====================================================================
 
-# agrega colegio a listado de colegios propuestos
+# agrega colegio a listado de colegios propuestos o elimina el seleccionado
 @app.callback(
     Output('datos-propuestas', 'data'),
-    Output('contenido-edicion', 'children'),
+    Output('contenido-edicion', 'children', allow_duplicate=True),
     Input('btn-ag-prop', 'n_clicks'),
-    State('parametros', 'data'),
+    Input('btn-elimina-prop', 'n_clicks'),
     State('in-rbd-prop', 'value'),
 #    State('in-nom-prop', 'label'),
+    State('viz-col-prop', 'selectedRows'),
     prevent_initial_call=True,
 )
-def arega_propuesta(click, param, rbd):
-    if click == 0:
-        raise PreventUpdate
-    else:
+def edita_propuestas(click, click2, rbd, filas):
+    disparador = dash.ctx.triggered_id
+
+    if disparador == 'btn-ag-prop' and click:
+        param = sesion_acreditada()
         dic = {
             'organizador_id': param['user'],
             'organizador': universidades[param['user']],
@@ -1882,149 +3300,144 @@ def arega_propuesta(click, param, rbd):
         df = nueva_propuesta(dic)
         return df, form_colegios_prop(df, param['user'])
 
+    elif disparador == 'btn-elimina-prop' and click2:
+        sesion_acreditada()
+        if filas:
+            id_el = filas[0]['prop_id']
+            usuario = filas[0]['organizador_id']
+            df = elimina_propuesta(id_el)
+            return df, form_colegios_prop(df, usuario)
+        else:
+            return dash.no_update, dash.no_update
 
-# exporta visitas programadas a excel
-@app.callback(
-    Output('exporta-visitas-archivo', 'data'),
-    Input('exporta-visitas', 'n_clicks'),
-    State('datos-programadas', 'data'),
-    State('parametros', 'data'),
-    prevent_initial_call=True,
-)
-def exporta_visitas_excel(click, datos, param):
-    if param['user'] == 0:
-        df = exporta_programada(datos, param['mes'], param['user'])
-        return dcc.send_bytes(df, 'visitas.xlsx')
-    else:
-        df = exporta_programada_detalle(param['mes'])
-        return dcc.send_bytes(df, 'visitas_detalle.xlsx')
-
-
-# exporta colegios propuestos a excel
-@app.callback(
-    Output('exporta-prop-archivo', 'data'),
-    Input('exporta-prop', 'n_clicks'),
-    State('datos-propuestas', 'data'),
-    prevent_initial_call=True,
-)
-def exporta_propuestas_excel(click, datos):
-    df = exporta_propuesta(datos)
-    return dcc.send_bytes(df, 'propuestas.xlsx')
+    raise PreventUpdate
 
 
-# elimina selección de listado de colegios propuestos
+# exporta visitas programadas (excel, csv o parquet) o reportes como trabajo en segundo plano; con cada intervalo
+# informa el avance y, al terminar, muestra el enlace de descarga
 @app.callback(
-    Output('datos-propuestas', 'data'),
-    Output('contenido-edicion', 'children'),
-    Input('btn-elimina-prop', 'n_clicks'),
-    State('viz-col-prop', 'selectedRows'),
+    Output('trabajo-exportacion', 'data'),
+    Output('estado-exportacion', 'children'),
+    Output('avance-exportacion', 'disabled'),
+    Input('exporta-visitas', 'n_clicks'),
+    Input('exporta-visitas-csv', 'n_clicks'),
+    Input('exporta-visitas-parquet', 'n_clicks'),
+    Input('exporta-reportes-pdf', 'n_clicks'),
+    Input('exporta-reportes-zip', 'n_clicks'),
+    Input('avance-exportacion', 'n_intervals'),
+    State('reportes-organizador', 'value'),
+    State('trabajo-exportacion', 'data'),
+    State('selec-mes', 'value'),
+    State('selec-temporada', 'value'),
     prevent_initial_call=True,
 )
-def elimina_colegio_propuesto(click, filas):
-    if click == 0:
-        raise PreventUpdate
+def exportacion(click_xlsx, click_csv, click_parquet, click_pdf, click_zip, _, organizador_id, trabajo, mes, anio):
+    if dash.ctx.triggered_id == 'avance-exportacion':
+        if not trabajo:
+            raise PreventUpdate
+        return dash.no_update, aviso_exportacion(trabajo), estado_exportacion(trabajo) in ('listo', 'error')
+
+    param = sesiones.actual()
+    formato = {
+        'exporta-visitas': 'xlsx',
+        'exporta-visitas-csv': 'csv',
+        'exporta-visitas-parquet': 'parquet',
+        'exporta-reportes-pdf': 'pdf',
+        'exporta-reportes-zip': 'zip',
+    }[dash.ctx.triggered_id]
+    consulta = {
+        'tipo': 'reportes' if formato in ('pdf', 'zip') else 'visitas',
+        'mes': mes,
+        'temporada': temporada_pedida(anio),
+        'formato': formato,
+    }
+    # los reportes no dependen del rol del usuario
+    if consulta['tipo'] == 'reportes':
+        consulta['organizador'] = organizador_id
     else:
-        if filas:
-            id_el = filas[0]['prop_id']
-            usuario = filas[0]['organizador_id']
-            df = elimina_propuesta(id_el)
-            return df, form_colegios_prop(df, usuario)
-        else:
-            return dash.no_update, dash.no_update,
+        consulta['rol'] = rol_usuario(param['user'])
+    trabajo = encola_exportacion(consulta)
+    return trabajo, aviso_exportacion(trabajo), estado_exportacion(trabajo) in ('listo', 'error')
 
 
 # BOTON elimina selección de listado de colegios programados
 @app.callback(
-    Output('datos-programadas', 'data'),
-    Output('contenido-edicion', 'children'), # recibe la misma forma actualizada: form_modifica
+    Output('cambios-programadas', 'data', allow_duplicate=True),
+    Output('contenido-edicion', 'children', allow_duplicate=True), # recibe la misma forma actualizada: form_modifica
     Input('btn-elim-visita', 'n_clicks'),
     State('ferias-prg-usr', 'selectedRows'),
+    State('version-programadas', 'data'),
     prevent_initial_call=True,
 )
-def elimina_colegio_programado(click, filas):
+def elimina_colegio_programado(click, filas, cliente):
     if click == 0:
         raise PreventUpdate
     else:
+        sesion_acreditada()
         if filas:
             id_el = filas[0]['prog_id']
             usuario = filas[0]['organizador_id']
-            df = elimina_programada(id_el, consume=True)
-            return df, form_modifica(df, usuario)
+            elimina_programada(id_el)
+            return cambios_cliente(cliente), form_modifica(usuario)
         else:
             return dash.no_update, dash.no_update
 
 
 # modifica colegio programado
 @app.callback(
-    Output('contenido-edicion', 'children'),
-    Output('parametros', 'data'),
+    Output('contenido-edicion', 'children', allow_duplicate=True),
     Input('btn-mod-visita', 'n_clicks'),
-    State('datos-programadas', 'data'),
     State('ferias-prg-usr', 'selectedRows'),
-    State('parametros', 'data'),
     prevent_initial_call=True,
 )
-def modifica_colegio_programado(click, datos, filas, param):
+def modifica_colegio_programado(click, filas):
     if click == 0:
         raise PreventUpdate
     else:
+        sesion_acreditada()
         if filas:
             id_mod = filas[0]['prog_id']
-            dic_original = (
-                pl.DataFrame(datos)
-                .filter(pl.col('prog_id') == id_mod)
-                .with_columns([
-                    pl.col('fecha').str.strptime(pl.Date, '%Y-%m-%d'),
-                    pl.col('hora_ini').str.strptime(pl.Time, '%H:%M:%S'),
-                    pl.col('hora_fin').str.strptime(pl.Time, '%H:%M:%S'),
-                    pl.col('hora_ins').str.strptime(pl.Time, '%H:%M:%S'),
-                ])
-                .to_dicts()
-            )[0]
-            param['id_modifica'] = id_mod
-            return form_modifica_visita(datos, dic_original), param
+            dic_original = detalle_programada(id_mod)
+            # la visita ya no existe: se vuelve a mostrar el listado actualizado
+            if dic_original is None:
+                return form_modifica(filas[0]['organizador_id'])
+            sesiones.actual()['id_modifica'] = id_mod
+            return form_modifica_visita(dic_original)
         else:
-            return dash.no_update, dash.no_update
+            return dash.no_update
 
 
 # vuelve de página de modificaciones sin cambio
 @app.callback(
-    Output('contenido-edicion', 'children'),
+    Output('contenido-edicion', 'children', allow_duplicate=True),
     Input('btn-mod-volver', 'n_clicks'),
-    State('datos-programadas', 'data'),
-    State('parametros', 'data'),
     prevent_initial_call=True,
 )
-def vuelve_sin_modificacion(click, datos, param):
+def vuelve_sin_modificacion(click):
     if click == 0:
         raise PreventUpdate
     else:
-        return form_modifica(datos, param['user'])
+        return form_modifica(sesiones.actual()['user'])
 
 
 # cambio de día en ventana de modificación
 @app.callback(
     Output('mod-ferias-prg', 'rowData'),
     Input('mod-fecha', 'date'),
-    State('datos-programadas', 'data'),
 )
-def mod_ferias_programadas_fecha(fecha, datos):
-    return programadas_fecha(datos, datetime.strptime(fecha, '%Y-%m-%d').date())
+def mod_ferias_programadas_fecha(fecha):
+    return programadas_fecha(datetime.strptime(fecha, '%Y-%m-%d').date())
 
 # ====================================================================
 
 # aplicar cambios en ventana de modificaciones
 @app.callback(
     Output('modal-fecha-no-disponible2', 'is_open'),
-    Output('datos-programadas', 'data'),
-    Output('contenido-edicion', 'children'),
-    Output('parametros', 'data'),
+    Output('cambios-programadas', 'data', allow_duplicate=True),
+    Output('contenido-edicion', 'children', allow_duplicate=True),
 
     Input('btn-mod-aplica', 'n_clicks'),
-    Input('cerrar-fecha-no-disponible2', 'n_clicks'),
 
-    State('datos-programadas', 'data'),
-    State('parametros', 'data'),
     State('mod-id-direccion', 'value'),
     State('mod-id-comuna', 'value'),
     State('mod-fecha', 'date'),
@@ -2040,79 +3453,102 @@ def mod_ferias_programadas_fecha(fecha, datos):
     State('mod-orienta-mail', 'value'),
     State('mod-estatus', 'value'),
     State('mod-obs-texto', 'value'),
+    State('version-programadas', 'data'),
     prevent_initial_call=True,
 )
-def aplica_cambios(click, click2, datos, param, direc, comuna, fecha_str, hr_ini, hr_fin, hr_ins, ct, ct_tel, ct_mail, ct_cargo, ori, ori_tel, ori_mail, est, obs):
+def aplica_cambios(click, direc, comuna, fecha_str, hr_ini, hr_fin, hr_ins, ct, ct_tel, ct_mail, ct_cargo, ori, ori_tel, ori_mail, est, obs, cliente):
     if click == 0:
         raise PreventUpdate
     else:
-        disparador = dash.ctx.triggered_id
+        param = sesion_acreditada()
+        nueva_fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+        fecha_original = datetime.strptime(param['fecha_ori'], '%Y-%m-%d').date()
+        if chk_bloqueado(nueva_fecha, bloqueadas_cache, excluye=fecha_original):
+            return True, dash.no_update, dash.no_update
+        else:
+            id_visita = param['id_modifica']
+            dic_original = detalle_programada(id_visita)
+            if dic_original is None:
+                param['id_modifica'] = None
+                return False, dash.no_update, form_modifica(param['user'])
+
+            cambia_fecha = False
+            if fecha_original != nueva_fecha:
+                cambia_fecha = True
+
+            dic_original['fecha'] = nueva_fecha
+            dic_original['direccion'] = direc
+            dic_original['comuna_id'] = comuna
+            dic_original['hora_ini'] = convierte_hora(hr_ini)
+            dic_original['hora_fin'] = convierte_hora(hr_fin)
+            dic_original['hora_ins'] = convierte_hora(hr_ins)
+            dic_original['contacto'] = ct
+            dic_original['contacto_tel'] = ct_tel
+            dic_original['contacto_mail'] = ct_mail
+            dic_original['contacto_cargo'] = ct_cargo
+            dic_original['orientador'] = ori
+            dic_original['orientador_tel'] = ori_tel
+            dic_original['orientador_mail'] = ori_mail
+            dic_original['estatus'] = est
+            dic_original['observaciones'] = obs
+
+            if isinstance(modifica_programada(id_visita, dic_original, cambia_fecha=cambia_fecha), FechaLlena):
+                return True, dash.no_update, dash.no_update
+            param['id_modifica'] = None
+
+            return False, cambios_cliente(cliente), form_modifica(param['user'])
 
-        if disparador == 'cerrar-fecha-no-disponible2':
-            return False, dash.no_update, dash.no_update, dash.no_update
+# ====================================================================
 
-        elif disparador == 'btn-mod-aplica':
-            nueva_fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-            fecha_original = datetime.strptime(param['fecha_ori'], '%Y-%m-%d').date()
-            if chk_bloqueado(nueva_fecha, verifica_bloqueados, excluye=fecha_original):
-                return True, dash.no_update, dash.no_update, dash.no_update
-            else:
-                id_visita = param['id_modifica']
-                dic_original = next(item for item in datos if item['prog_id'] == id_visita)
-
-                cambia_fecha = False
-                if fecha_original != nueva_fecha:
-                    cambia_fecha = True
-
-                dic_original['fecha'] = nueva_fecha
-                dic_original['direccion'] = direc
-                dic_original['comuna_id'] = comuna
-                dic_original['hora_ini'] = convierte_hora(hr_ini)
-                dic_original['hora_fin'] = convierte_hora(hr_fin)
-                dic_original['hora_ins'] = convierte_hora(hr_ins)
-                dic_original['contacto'] = ct
-                dic_original['contacto_tel'] = ct_tel
-                dic_original['contacto_mail'] = ct_mail
-                dic_original['contacto_cargo'] = ct_cargo
-                dic_original['orientador'] = ori
-                dic_original['orientador_tel'] = ori_tel
-                dic_original['orientador_mail'] = ori_mail
-                dic_original['estatus'] = est
-                dic_original['observaciones'] = obs
-
-                nuevos_datos = modifica_programada(id_visita, dic_original, cambia_fecha=cambia_fecha, consume=True)
-                param['id_modifica'] = None
+# cierre de los modales en el navegador (el de la visita además limpia la selección de la grilla)
+for modal, boton in (('modal-fecha-no-disponible', 'cerrar-fecha-no-disponible'), ('modal-fecha-no-disponible2', 'cerrar-fecha-no-disponible2')):
+    app.clientside_callback(
+        ClientsideFunction(namespace='modales', function_name='cierra'),
+        Output(modal, 'is_open', allow_duplicate=True),
+        Input(boton, 'n_clicks'),
+        prevent_initial_call=True,
+    )
 
-                return False, nuevos_datos, form_modifica(nuevos_datos, param['user']), param
+app.clientside_callback(
+    ClientsideFunction(namespace='modales', function_name='cierra_reporte'),
+    Output('modal-reporte-prog', 'is_open', allow_duplicate=True),
+    Output('viz-ferias', 'selectedRows'),
+    Input('btn-cerrar-reporte-prog', 'n_clicks'),
+    prevent_initial_call=True,
+)
 
-# ====================================================================
+# solo una selección no vacía llega al servidor (al limpiarla no se abre el modal)
+app.clientside_callback(
+    ClientsideFunction(namespace='modales', function_name='seleccion'),
+    Output('visita-reporte', 'data'),
+    Input('viz-ferias', 'selectedRows'),
+    prevent_initial_call=True,
+)
 
 # abre modal con la información de la visita programada
 @app.callback(
     Output('modal-reporte-prog', 'is_open'),
     Output('reporte-prog-contenido', 'children'),
-    Output('viz-ferias', 'selectedRows'),
-    Input('viz-ferias', 'selectedRows'),
-    Input('btn-cerrar-reporte-prog', 'n_clicks'),
-    State('datos-programadas', 'data'),
-    State('parametros', 'data')
+    Input('visita-reporte', 'data'),
+    State('selec-temporada', 'value'),
 )
-def abre_modal_reporte(visita, _, datos, param):
-    disparador = dash.ctx.triggered_id
-
-    if disparador == 'btn-cerrar-reporte-prog':
-        return False, dash.no_update, []
-
+def abre_modal_reporte(visita, anio):
     if visita:
         id_sel = visita[0]['prog_id']
-        asiste_dic = dic_asisten(id_sel)
-        datos = next(item for item in datos if item['prog_id'] == id_sel)
-        if param['user'] == 0:
+        param = sesiones.actual()
+        anio = temporada_pedida(anio)
+        datos = detalle_programada(id_sel, consume=True, anio=anio)
+        # visita eliminada (p. ej. desde otro worker) después de cargar la grilla
+        if datos is None:
+            raise PreventUpdate
+        asiste_dic = asistencia(id_sel)['todas']
+        # las temporadas anteriores son de solo lectura
+        if param['user'] == 0 or anio != temporada:
             return True, html.Div([
                 seccion_info_gral(datos),
                 linea,
                 seccion_universidades_asisten(asiste_dic),
-            ]), dash.no_update
+            ])
         else:
             return True, html.Div([
                 seccion_info_gral(datos),
@@ -2122,36 +3558,34 @@ def abre_modal_reporte(visita, _, datos, param):
                 espacio,
                 seccion_universidades_asisten(asiste_dic, crt=0),
                 selector_asiste(param['user'], asiste_dic),
-            ]), dash.no_update
+            ])
 
-    return dash.no_update, dash.no_update, dash.no_update
+    return dash.no_update, dash.no_update
 
 # cambia la condición de asistente a visita
 @app.callback(
-    Output('parametros', 'data'),
     Input('selector-asiste', 'value'),
     State('viz-ferias', 'selectedRows'),
-    State('parametros', 'data'),
 #    prevent_initial_call=True,
 )
-def cambia_condicion_asiste(asiste, visita, param):
+def cambia_condicion_asiste(asiste, visita):
     id_sel = visita[0]['prog_id']
-    cambia_asiste(param['user'], id_sel, asiste)
-    return param
+    cambia_asiste(sesion_acreditada()['user'], id_sel, asiste)
 
 # descarga reporte de la visita en formato pdf
 @app.callback(
     Output('descarga-reporte-archivo', 'data'),
     Input('descarga-reporte', 'n_clicks'),
     State('viz-ferias', 'selectedRows'),
-    State('datos-programadas', 'data'),
+    State('selec-temporada', 'value'),
     prevent_initial_call=True,
 )
-def descarga_reporte_pdf(_, filas, datos):
+def descarga_reporte_pdf(_, filas, anio):
     id_rep = filas[0]['prog_id']
-    visita = next(item for item in datos if item['prog_id'] == id_rep)
-    asisten = def_asisten(id_rep)
-    doc = exporta_reporte(visita, asisten)
+    visita = detalle_programada(id_rep, consume=True, anio=temporada_pedida(anio))
+    if visita is None:
+        raise PreventUpdate
+    doc = exporta_reporte(visita, asistencia(id_rep)['asisten'])
     return dcc.send_bytes(doc, f"reporte_{str(visita['rbd'])}.pdf")
 
 
@@ -2163,35 +3597,58 @@ def descarga_reporte_pdf(_, filas, datos):
 def evalua_fecha_bloqueada(fecha_str):
     fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
 #    return chk_bloqueado(fecha, bloqueados_local)
-    return chk_bloqueado(fecha, verifica_bloqueados)
+    return chk_bloqueado(fecha, bloqueadas_cache)
 
 
 # restringe visibilidad de boton que modifica visita
 @app.callback(
     Output('btn-mod-aplica', 'disabled'),
     Input('mod-fecha', 'date'),
-    State('parametros', 'data'),
 )
-def evalua_fecha_bloqueada_2(fecha_str, param):
-    fecha_original = datetime.strptime(param['fecha_ori'], '%Y-%m-%d').date()
+def evalua_fecha_bloqueada_2(fecha_str):
+    fecha_original = datetime.strptime(sesiones.actual()['fecha_ori'], '%Y-%m-%d').date()
     fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
 #    return chk_bloqueado(fecha, bloqueados_local, excluye=fecha_original)
-    return chk_bloqueado(fecha, verifica_bloqueados, excluye=fecha_original)
+    return chk_bloqueado(fecha, bloqueadas_cache, excluye=fecha_original)
 
 
 # rescata fecha de visita a modificar
 @app.callback(
-    Output('parametros', 'data'),
     Input('ferias-prg-usr', 'selectedRows'),
-    State('parametros', 'data'),
     prevent_initial_call=True,
 )
-def guarda_fecha_original(filas, param):
+def guarda_fecha_original(filas):
     if filas == None:
         raise PreventUpdate
     else:
-        param['fecha_ori'] = datetime.strptime(filas[0]['fecha'], '%Y-%m-%d').date()
-        return param
+        sesiones.actual()['fecha_ori'] = filas[0]['fecha']
+
+
+# fusiona en el store los cambios de cada escritura (assets/programadas.js); version-programadas repite el origen y
+# la versión del store para que las escrituras los reciban sin enviar la tabla
+app.clientside_callback(
+    ClientsideFunction(namespace='programadas', function_name='fusiona'),
+    Output('datos-programadas', 'data'),
+    Output('recarga-programadas', 'data'),
+    Output('version-programadas', 'data'),
+    Input('cambios-programadas', 'data'),
+    State('datos-programadas', 'data'),
+    prevent_initial_call=True,
+)
+
+
+# entrega los cambios faltantes cuando la versión del store diverge de la del servidor
+@app.callback(
+    Output('cambios-programadas', 'data', allow_duplicate=True),
+    Input('recarga-programadas', 'data'),
+    prevent_initial_call=True,
+)
+def recarga_cambios_programadas(estado):
+    return cambios_desde(estado['origen'], estado['version'])
+
+
+tiempo_arranque = reloj.perf_counter() - inicio_arranque
+logger.info('arranque del worker %s en %.0f ms', os.getpid(), 1000 * tiempo_arranque)
 
 
 # ejecución de la aplicación
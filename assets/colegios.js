@@ -0,0 +1,61 @@
+const busquedas_colegios = {};
+
+// tablas de colegios (/referencias/colegios.json) leídas una sola vez por página; el navegador revalida la caché
+let tablas_colegios = null;
+
+function lee_tablas() {
+    if (!tablas_colegios) {
+        tablas_colegios = fetch('/referencias/colegios.json', {cache: 'no-cache'})
+            .then(respuesta => respuesta.json())
+            .then(tabla => ({
+                nombres: new Map(tabla.rbd.map((rbd, i) => [rbd, tabla.nombre[i]])),
+                comunas: new Map(tabla.rbd.map((rbd, i) => [rbd, tabla.comuna[i]])),
+            }))
+            .catch(error => {
+                tablas_colegios = null;
+                throw error;
+            });
+    }
+    return tablas_colegios;
+}
+
+// RBD ingresado -> nombre (con su opción en el selector) y comuna; nombre elegido -> RBD y comuna; limpiar -> vacío
+function completa_colegio(rbd, nombre, con_comuna) {
+    const sin_cambio = window.dash_clientside.no_update;
+    const disparador = window.dash_clientside.callback_context.triggered[0].prop_id.split('.')[0];
+    const ajusta = salida => con_comuna ? salida : [salida[0], salida[1], salida[3]];
+
+    if (disparador === 'sel-nombre' || disparador === 'in-nom-prop') {
+        return lee_tablas().then(t => ajusta([nombre, sin_cambio, nombre == null ? null : (t.comunas.get(nombre) ?? null), sin_cambio]));
+    }
+    if (disparador === 'sel-rbd' || disparador === 'in-rbd-prop') {
+        return lee_tablas().then(t => t.nombres.has(rbd)
+            ? ajusta([sin_cambio, rbd, t.comunas.get(rbd), [{label: t.nombres.get(rbd), value: rbd}]])
+            : ajusta([null, sin_cambio, sin_cambio, sin_cambio]));
+    }
+    return ajusta([null, null, null, sin_cambio]);
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    colegios: {
+        // retrasa la búsqueda hasta que el usuario deja de escribir; solo se envía el último texto
+        espera: function(texto) {
+            const clave = window.dash_clientside.callback_context.triggered.map(t => t.prop_id).join();
+            const marca = (busquedas_colegios[clave] || 0) + 1;
+            busquedas_colegios[clave] = marca;
+
+            return new Promise(resolve => setTimeout(() => {
+                const vigente = busquedas_colegios[clave] === marca && texto;
+                resolve(vigente ? texto : window.dash_clientside.no_update);
+            }, 300));
+        },
+        // salidas: sel-rbd, sel-nombre, id-comuna y opciones de sel-nombre
+        completa: function(rbd, nombre, _) {
+            return completa_colegio(rbd, nombre, true);
+        },
+        // salidas: in-rbd-prop, in-nom-prop y opciones de in-nom-prop
+        completa_propuesta: function(rbd, nombre, _) {
+            return completa_colegio(rbd, nombre, false);
+        }
+    }
+});
@@ -0,0 +1,75 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    programadas: {
+        // fusiona los cambios enviados por el servidor con el store datos-programadas; la tercera salida
+        // (version-programadas) es el origen y la versión del store, que las escrituras envían al servidor
+        fusiona: function(cambios, datos) {
+            const sin_cambio = window.dash_clientside.no_update;
+            const version = store => ({origen: store.origen, version: store.version});
+
+            if (!cambios) {
+                return [sin_cambio, sin_cambio, sin_cambio];
+            }
+            if (cambios.completo) {
+                const store = {origen: cambios.origen, version: cambios.version};
+                // con la grilla en el servidor (MODELO_GRILLA=servidor) el store no lleva filas
+                if (cambios.agrega) {
+                    store.filas = cambios.agrega;
+                }
+                return [store, sin_cambio, version(store)];
+            }
+            // versiones divergentes: se piden al servidor los cambios desde la versión local
+            if (!datos || datos.origen !== cambios.origen || datos.version !== cambios.desde) {
+                return [sin_cambio, {origen: datos ? datos.origen : null, version: datos ? datos.version : -1}, sin_cambio];
+            }
+
+            const store = {origen: cambios.origen, version: cambios.version};
+            if (datos.filas) {
+                const ids = new Set(cambios.elimina.concat(cambios.agrega.map(fila => fila.prog_id)));
+                store.filas = datos.filas.filter(fila => !ids.has(fila.prog_id)).concat(cambios.agrega);
+            }
+
+            return [store, sin_cambio, version(store)];
+        },
+        // filas del mes (0: todos) de la temporada vigente desde el store; otra temporada se pide al servidor
+        filtra: function(mes, anio, datos, vigente) {
+            const sin_cambio = window.dash_clientside.no_update;
+
+            if (anio != null && anio !== vigente) {
+                return [sin_cambio, {mes: mes || 0, temporada: anio}];
+            }
+            if (!datos) {
+                return [sin_cambio, sin_cambio];
+            }
+
+            const dos = String(mes || 0).padStart(2, '0');
+            const filas = datos.filas
+                .filter(fila => !mes || fila.fecha.slice(5, 7) === dos)
+                .sort((a, b) => a.fecha < b.fecha ? -1 : a.fecha > b.fecha ? 1 : a.prog_id - b.prog_id);
+
+            return [filas, sin_cambio];
+        }
+    },
+    modales: {
+        cierra: function(_) {
+            return false;
+        },
+        // cierra el modal de la visita y limpia la selección de la grilla
+        cierra_reporte: function(_) {
+            return [false, []];
+        },
+        // solo una selección no vacía abre el modal de la visita
+        seleccion: function(filas) {
+            return filas && filas.length ? filas : window.dash_clientside.no_update;
+        }
+    },
+    grillas: {
+        // descarta los bloques de la grilla infinita para que vuelva a pedir filas con el nuevo mes
+        reinicia: function(mes) {
+            const api = dash_ag_grid.getApi('viz-ferias');
+            if (api && api.getGridOption('rowModelType') === 'infinite') {
+                api.purgeInfiniteCache();
+            }
+            return {rowIndex: 0};
+        }
+    }
+});
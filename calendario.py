@@ -0,0 +1,68 @@
+### Calendario de días hábiles
+# arreglo ordenado de los días hábiles de la temporada (sin feriados ni fines de semana); las consultas usan
+# búsqueda binaria. El día actual se calcula en la zona horaria de Santiago y se renueva a la medianoche local.
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+import pytz
+
+
+class Calendario:
+
+    def __init__(self, inicio, fin, no_laborales, zona='America/Santiago'):
+        self.inicio = inicio
+        self.fin = fin
+        self.zona = pytz.timezone(zona)
+        self.carga(no_laborales)
+
+    # recalcula los días hábiles (p. ej. al recargar el archivo de feriados)
+
+    def carga(self, no_laborales):
+        excluidos = set(no_laborales)
+        dias = (self.inicio + timedelta(days=i) for i in range((self.fin - self.inicio).days + 1))
+        self.dias = [dia for dia in dias if dia not in excluidos]
+        self.feriados = sorted(dia for dia in excluidos if self.inicio <= dia <= self.fin)
+        self.vigente = None
+
+    # fecha actual en Santiago y primer día hábil desde ella; se recalculan solo al pasar la medianoche local
+
+    def estado(self):
+        momento = datetime.now(self.zona)
+        if self.vigente is None or momento >= self.vigente[2]:
+            hoy = momento.date()
+            medianoche = self.zona.localize(datetime.combine(hoy + timedelta(days=1), time()))
+            self.vigente = (hoy, self.siguiente(hoy), medianoche)
+        return self.vigente
+
+    def hoy(self):
+        return self.estado()[0]
+
+    def dia_laboral(self):
+        return self.estado()[1]
+
+    # primer día hábil igual o posterior a la fecha (la misma fecha si la temporada ya terminó)
+
+    def siguiente(self, fecha):
+        i = bisect_left(self.dias, fecha)
+        return self.dias[i] if i < len(self.dias) else fecha
+
+    def es_laboral(self, fecha):
+        i = bisect_left(self.dias, fecha)
+        return i < len(self.dias) and self.dias[i] == fecha
+
+    # una fecha se puede reservar si es hábil y no es anterior al próximo día hábil
+
+    def reservable(self, fecha):
+        return fecha >= self.dia_laboral() and self.es_laboral(fecha)
+
+    def cuenta(self, desde, hasta):
+        return max(0, bisect_right(self.dias, hasta) - bisect_left(self.dias, desde))
+
+    def rango(self, desde, hasta):
+        return self.dias[bisect_left(self.dias, desde):bisect_right(self.dias, hasta)]
+
+    # días no hábiles desde una fecha (para deshabilitarlos en los selectores de fecha)
+
+    def no_laborales(self, desde=None):
+        return self.feriados[bisect_left(self.feriados, desde or self.inicio):]
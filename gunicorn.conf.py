@@ -0,0 +1,52 @@
+# configuración de gunicorn (Procfile: gunicorn -c gunicorn.conf.py app:server)
+#
+# perfiles (GUNICORN_WORKER):
+#   gthread (por omisión): cada worker atiende GUNICORN_THREADS pedidos a la vez; un callback que espera a Postgres
+#       ocupa un hilo, no el proceso, y las exportaciones corren en hilos propios sin detener a los callbacks.
+#   sync: un pedido por worker (comportamiento anterior).
+#
+# por omisión un solo worker con hilos. Cada worker guarda sus propias copias de programadas, asisten y propuestas:
+# con más de uno (WEB_CONCURRENCY) la base debe tener la tabla versiones (scripts/versiones.sql), con la que cada
+# worker relee las copias que otro dejó atrasadas; sin ella solo se releen al vencer TTL_INSTANTANEA.
+#
+# sin --preload: el pool de hilos de Polars no sobrevive al fork (el worker queda bloqueado en la primera consulta
+# a un DataFrame); cada worker carga sus propios datos al arrancar.
+#
+# con más de un worker las sesiones se guardan en SQLite (SESIONES_SQLITE), que comparten los workers del servidor
+
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+worker_class = os.environ.get('GUNICORN_WORKER', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+
+preload_app = False
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# reciclaje periódico de workers (0: desactivado)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG') or None
+
+# pool de conexiones a la medida de los pedidos simultáneos de cada worker
+os.environ.setdefault('PG_POOL_SIZE', str(threads if worker_class == 'gthread' else 5))
+
+if workers > 1:
+    os.environ.setdefault('SESIONES_SQLITE', os.path.join(tempfile.gettempdir(), 'sesiones-visitas.db'))
+
+
+def when_ready(server):
+    server.log.info(
+        'perfil %s: workers=%s hilos=%s pool=%s+%s sesiones=%s',
+        worker_class, workers, threads,
+        os.environ['PG_POOL_SIZE'], os.environ.get('PG_POOL_MAX_OVERFLOW', 10),
+        os.environ.get('SESIONES_SQLITE', 'memoria'),
+    )
+
@@ -0,0 +1,224 @@
+### Métricas de callbacks y consultas
+# instrumentación opcional (METRICAS=1): cada pedido al servidor se mide con su callback (o su ruta) y se le
+# atribuyen las consultas a Postgres que ejecuta; las consultas fuera de un pedido (refrescos en segundo plano,
+# exportaciones) se cuentan como 'fondo'. Los acumulados se exponen en /metrics (formato de texto de Prometheus)
+# y cada pedido se registra como una línea JSON (METRICAS_LOG=ruta, o stderr).
+#
+# los acumulados son de cada worker: /metrics responde con los del worker que atiende la consulta (etiqueta pid)
+
+import os
+import sys
+import json
+import logging
+import threading
+import time as reloj
+from collections import defaultdict
+
+from flask import request, g, has_request_context, Response
+from sqlalchemy import event
+
+activo = os.environ.get('METRICAS', '0') == '1'
+umbral_lenta = float(os.environ.get('METRICAS_LENTA_MS', 200)) / 1000
+
+logger = logging.getLogger('app-visitas.metricas')
+
+# límites del histograma de duración de pedidos (segundos)
+limites = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# acumulados por callback: pedidos, errores, segundos, consultas, segundos en consultas, filas y bytes
+
+def acumulado_inicial():
+    return {
+        'pedidos': 0,
+        'errores': 0,
+        'segundos': 0.,
+        'consultas': 0,
+        'consultas_segundos': 0.,
+        'filas': 0,
+        'bytes_entrada': 0,
+        'bytes_salida': 0,
+        'histograma': [0] * (len(limites) + 1),
+    }
+
+acumulados = defaultdict(acumulado_inicial)
+candado = threading.Lock()
+
+config = {
+    'app': None,
+    'ruta_callbacks': None,
+    'callbacks': {},
+}
+
+# nombre de la función del callback a partir de la salida del pedido (se resuelve una vez por salida)
+
+def nombre_callback(cuerpo):
+    salida = (cuerpo or {}).get('output')
+    nombres = config['callbacks']
+    if salida not in nombres:
+        callback = config['app'].callback_map.get(salida, {}).get('callback')
+        nombres[salida] = getattr(callback, '__name__', None) or 'desconocido'
+    return nombres[salida]
+
+
+def nombre_pedido():
+    if request.path == config['ruta_callbacks']:
+        return nombre_callback(request.get_json(silent=True))
+    return request.url_rule.rule if request.url_rule else 'sin_ruta'
+
+# consultas: duración y filas de cada ejecución del cursor
+
+def antes_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('inicio_consulta', []).append(reloj.perf_counter())
+
+
+def consulta_fallida(contexto):
+    if contexto.connection is not None and contexto.connection.info.get('inicio_consulta'):
+        contexto.connection.info['inicio_consulta'].pop()
+
+
+def despues_consulta(conn, cursor, statement, parameters, context, executemany):
+    duracion = reloj.perf_counter() - conn.info['inicio_consulta'].pop()
+    filas = max(cursor.rowcount, 0)
+
+    if has_request_context() and 'metricas' in g:
+        medida = g.metricas
+        medida['consultas'] += 1
+        medida['consultas_segundos'] += duracion
+        medida['filas'] += filas
+        callback = medida['nombre']
+    else:
+        callback = 'fondo'
+        with candado:
+            acumulado = acumulados[callback]
+            acumulado['consultas'] += 1
+            acumulado['consultas_segundos'] += duracion
+            acumulado['filas'] += filas
+
+    if duracion >= umbral_lenta:
+        registra({'tipo': 'consulta', 'callback': callback, 'ms': round(1000 * duracion, 1), 'filas': filas,
+                  'sql': ' '.join(statement.split())[:300]})
+
+# pedidos: se registra primero (antes que las sesiones y el ETag del layout) para medir el pedido completo
+
+def inicia_pedido():
+    if request.path == '/metrics':
+        return
+    g.metricas = {
+        'nombre': nombre_pedido(),
+        'inicio': reloj.perf_counter(),
+        'consultas': 0,
+        'consultas_segundos': 0.,
+        'filas': 0,
+    }
+
+
+def termina_pedido(respuesta):
+    medida = g.pop('metricas', None)
+    if medida is None:
+        return respuesta
+
+    duracion = reloj.perf_counter() - medida['inicio']
+    entrada = request.content_length or 0
+    salida = respuesta.content_length or 0
+    with candado:
+        acumulado = acumulados[medida['nombre']]
+        acumulado['pedidos'] += 1
+        acumulado['errores'] += respuesta.status_code >= 500
+        acumulado['segundos'] += duracion
+        acumulado['consultas'] += medida['consultas']
+        acumulado['consultas_segundos'] += medida['consultas_segundos']
+        acumulado['filas'] += medida['filas']
+        acumulado['bytes_entrada'] += entrada
+        acumulado['bytes_salida'] += salida
+        acumulado['histograma'][next((i for i, limite in enumerate(limites) if duracion <= limite), len(limites))] += 1
+
+    registra({
+        'tipo': 'pedido',
+        'callback': medida['nombre'],
+        'estado': respuesta.status_code,
+        'ms': round(1000 * duracion, 1),
+        'consultas': medida['consultas'],
+        'consultas_ms': round(1000 * medida['consultas_segundos'], 1),
+        'filas': medida['filas'],
+        'bytes_entrada': entrada,
+        'bytes_salida': salida,
+    })
+    return respuesta
+
+
+def registra(datos):
+    logger.info(json.dumps(datos | {'pid': os.getpid()}, ensure_ascii=False))
+
+# totales de todos los callbacks (p. ej. consultas antes y después de una acción)
+
+def total(clave):
+    with candado:
+        return sum(acumulado[clave] for acumulado in acumulados.values())
+
+# texto de Prometheus
+
+def etiqueta(callback):
+    return callback.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def exposicion():
+    with candado:
+        copia = {callback: dict(acumulado, histograma=list(acumulado['histograma'])) for callback, acumulado in acumulados.items()}
+
+    pid = os.getpid()
+    lineas = []
+    series = [
+        ('visitas_pedidos_total', 'counter', 'pedidos atendidos', 'pedidos'),
+        ('visitas_pedidos_error_total', 'counter', 'pedidos con respuesta 5xx', 'errores'),
+        ('visitas_consultas_total', 'counter', 'consultas a Postgres', 'consultas'),
+        ('visitas_consultas_segundos_total', 'counter', 'tiempo en consultas a Postgres', 'consultas_segundos'),
+        ('visitas_filas_total', 'counter', 'filas leídas o escritas por las consultas', 'filas'),
+        ('visitas_bytes_entrada_total', 'counter', 'bytes recibidos en los pedidos', 'bytes_entrada'),
+        ('visitas_bytes_salida_total', 'counter', 'bytes enviados en las respuestas', 'bytes_salida'),
+    ]
+    for nombre, tipo, ayuda, clave in series:
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+        lineas += [f'{nombre}{{callback="{etiqueta(c)}",pid="{pid}"}} {a[clave]}' for c, a in sorted(copia.items())]
+
+    nombre = 'visitas_pedido_segundos'
+    lineas += [f'# HELP {nombre} duración de los pedidos', f'# TYPE {nombre} histogram']
+    for c, a in sorted(copia.items()):
+        if not a['pedidos']:
+            continue
+        base = f'callback="{etiqueta(c)}",pid="{pid}"'
+        acumulado = 0
+        for limite, cantidad in zip(list(limites) + ['+Inf'], a['histograma']):
+            acumulado += cantidad
+            lineas.append(f'{nombre}_bucket{{{base},le="{limite}"}} {acumulado}')
+        lineas.append(f'{nombre}_sum{{{base}}} {a["segundos"]}')
+        lineas.append(f'{nombre}_count{{{base}}} {a["pedidos"]}')
+
+    return '\n'.join(lineas) + '\n'
+
+
+def metrics():
+    return Response(exposicion(), mimetype='text/plain; version=0.0.4')
+
+# enlaza la instrumentación con el servidor Flask, los callbacks de Dash y el engine de SQLAlchemy
+
+def instala(app, engine):
+    if not activo:
+        return
+
+    ruta_log = os.environ.get('METRICAS_LOG')
+    manejador = logging.FileHandler(ruta_log) if ruta_log else logging.StreamHandler(sys.stderr)
+    manejador.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(manejador)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    config['ruta_callbacks'] = app.config.routes_pathname_prefix + '_dash-update-component'
+    config['app'] = app
+
+    event.listen(engine, 'before_cursor_execute', antes_consulta)
+    event.listen(engine, 'after_cursor_execute', despues_consulta)
+    event.listen(engine, 'handle_error', consulta_fallida)
+
+    app.server.before_request(inicia_pedido)
+    app.server.after_request(termina_pedido)
+    app.server.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,145 @@
+### Datos de referencia
+# cada archivo de data/ se lee una sola vez; las tablas quedan como DataFrames tipados (Arrow) y la aplicación
+# usa vistas en diccionario/lista que se actualizan en su lugar, de modo que las referencias importadas
+# siguen siendo válidas después de una recarga.
+#
+# cada worker de gunicorn carga sus propias tablas (sin --preload: el pool de hilos de Polars no sobrevive al fork);
+# recarga() (o vigila(), que revisa la fecha de modificación de los archivos) reemplaza los datos sin reiniciar.
+
+import os
+import logging
+import threading
+import time as reloj
+from datetime import date
+
+import polars as pl
+
+logger = logging.getLogger('app-visitas')
+
+directorio = os.environ.get('DIR_DATOS', './data')
+
+# temporada vigente (TEMPORADA) y período de visitas de cada temporada
+
+temporada = int(os.environ.get('TEMPORADA', 2025))
+
+def rango_temporada(anio):
+    return date(anio, 3, 1), date(anio, 11, 30)
+
+# cada temporada tiene su archivo de feriados (incluye fines de semana): data/feriados<año>.parquet
+
+def archivo_feriados(anio):
+    return f'feriados{anio}.parquet'
+
+archivos = {
+    'colegios': 'colegios.parquet',
+    'comunas': 'comunas.parquet',
+    'horas': 'div_horas.parquet',
+    'feriados': archivo_feriados(temporada),
+}
+
+# tablas tipadas y vistas que usa la aplicación
+
+tablas = {}
+
+colegios = {}           # rbd -> nombre
+colegios_comuna = {}    # rbd -> código de comuna
+comunas = {}            # código -> comuna (ordenado por nombre)
+horas_15 = {}           # hora -> etiqueta
+feriados = []           # fechas feriadas
+
+estado = {
+    'version': 0,
+    'mtimes': {},
+    'revisado': None,
+}
+
+candado = threading.Lock()
+
+# funciones que se ejecutan después de cada recarga (p. ej. índices derivados)
+
+oyentes = []
+
+def al_recargar(fn):
+    oyentes.append(fn)
+    return fn
+
+
+def ruta(nombre):
+    return os.path.join(directorio, archivos[nombre])
+
+
+def mtimes():
+    return {nombre: os.stat(ruta(nombre)).st_mtime if os.path.exists(ruta(nombre)) else None for nombre in archivos}
+
+# feriados de una temporada; si falta el archivo, solo se excluyen los fines de semana
+
+def lee_feriados(anio):
+    archivo = os.path.join(directorio, archivo_feriados(anio))
+    if os.path.exists(archivo):
+        return pl.read_parquet(archivo).to_series().sort()
+    logger.warning('no existe %s: el calendario de %s solo excluye fines de semana', archivo, anio)
+    dias = pl.date_range(*rango_temporada(anio), eager=True)
+    return dias.filter(dias.dt.weekday() > 5)
+
+# reemplaza el contenido de un diccionario sin dejarlo vacío en ningún momento
+
+def reemplaza(dic, nuevo):
+    dic.update(nuevo)
+    for clave in dic.keys() - nuevo.keys():
+        del dic[clave]
+
+
+def lee_tablas():
+    return {
+        'colegios': pl.read_parquet(ruta('colegios'), columns=['rbd', 'nombre', 'cod_com']),
+        'comunas': pl.read_parquet(ruta('comunas')).sort('comuna'),
+        'horas': pl.read_parquet(ruta('horas')),
+        'feriados': lee_feriados(temporada),
+    }
+
+# lee todos los archivos y actualiza las vistas en su lugar
+
+def carga():
+    marcas = mtimes()
+    nuevas = lee_tablas()
+    col = nuevas['colegios']
+
+    with candado:
+        tablas.update(nuevas)
+        reemplaza(colegios, dict(zip(col['rbd'].to_list(), col['nombre'].to_list())))
+        reemplaza(colegios_comuna, dict(zip(col['rbd'].to_list(), col['cod_com'].to_list())))
+        reemplaza(comunas, dict(nuevas['comunas'].rows()))
+        reemplaza(horas_15, dict(nuevas['horas'].rows()))
+        feriados[:] = nuevas['feriados'].to_list()
+        estado['mtimes'] = marcas
+        estado['revisado'] = reloj.monotonic()
+        estado['version'] += 1
+
+    for fn in oyentes:
+        fn()
+
+
+def recarga():
+    carga()
+    logger.info('datos de referencia recargados (versión %s)', estado['version'])
+    return estado['version']
+
+# recarga si algún archivo cambió; revisa como máximo una vez cada ttl segundos (cada worker por su cuenta)
+
+ttl_referencias = int(os.environ.get('TTL_REFERENCIAS', 300))
+
+def vigila(ttl=ttl_referencias):
+    if estado['revisado'] is not None and reloj.monotonic() - estado['revisado'] < ttl:
+        return False
+    estado['revisado'] = reloj.monotonic()
+    try:
+        if mtimes() == estado['mtimes']:
+            return False
+        recarga()
+    except Exception:
+        logger.exception('no se pudieron recargar los datos de referencia')
+        return False
+    return True
+
+
+carga()
@@ -0,0 +1,95 @@
+### Reportes de visitas en pdf
+# dibujo de las páginas de reporte a partir de datos ya formateados; no importa la aplicación, de modo que
+# los procesos auxiliares que generan lotes grandes solo cargan reportlab.
+#
+# página: {'titulo': str, 'items': [(etiqueta, valor)], 'universidades': [nombre]}
+
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.lib.colors import HexColor
+
+cm = 72. / 2.54
+tamano_carta = (612., 792.)
+azul = HexColor('#1b81e5')
+gris = HexColor('#596a6d')
+
+
+def dibuja_pagina(canvas, pagina):
+    top = 792. - (1.3 * cm) - 24
+    step = 19
+
+    canvas.setFont('Helvetica', 24)
+    canvas.setFillColor(azul)
+    canvas.drawCentredString(306, top, pagina['titulo'])
+    top -= (step + 14)
+
+    canvas.setFont('Helvetica', 16)
+    canvas.drawString((2 * cm), top, 'Antecedentes de la Visita')
+    top -= (step + 4)
+
+    canvas.setFont('Helvetica', 12)
+    canvas.setFillColor(gris)
+    for etiqueta, valor in pagina['items']:
+        canvas.drawString((2.5 * cm), top, f'{etiqueta}')
+        canvas.drawString((2.5 * cm)*2.02, top, ':')
+        canvas.drawString((2.5 * cm)*2.17, top, f'{valor}')
+        top -= step
+
+    top -= step
+    canvas.setFont('Helvetica', 16)
+    canvas.setFillColor(azul)
+    canvas.drawString((2 * cm), top, 'Universidades Participantes')
+    top -= (step + 4)
+
+    canvas.setFont('Helvetica', 12)
+    canvas.setFillColor(gris)
+    for universidad in pagina['universidades']:
+        canvas.drawString((2.5 * cm), top, universidad)
+        top -= step
+
+# un único documento con una página por visita (fuentes y colores se comparten en todo el documento)
+
+def escribe_pdf(paginas, destino):
+    canvas = Canvas(destino, pagesize=tamano_carta)
+    for pagina in paginas:
+        dibuja_pagina(canvas, pagina)
+        canvas.showPage()
+    if not paginas:
+        canvas.setFont('Helvetica', 16)
+        canvas.drawCentredString(306, 700, 'Sin visitas para la selección')
+        canvas.showPage()
+    canvas.save()
+
+
+def pdf(paginas):
+    output = io.BytesIO()
+    escribe_pdf(paginas, output)
+    return output.getvalue()
+
+# zip con un pdf por visita; los lotes grandes se reparten entre procesos
+
+def pdfs(paginas):
+    return [pdf([pagina]) for pagina in paginas]
+
+
+def escribe_zip(nombres, paginas, destino, procesos=1, lote=100):
+    if procesos > 1 and len(paginas) > lote:
+        partes = [paginas[i:i + lote] for i in range(0, len(paginas), lote)]
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=get_context('spawn')) as pool:
+            documentos = [documento for parte in pool.map(pdfs, partes) for documento in parte]
+    else:
+        documentos = pdfs(paginas)
+
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, documento in zip(nombres, documentos):
+            archivo.writestr(nombre, documento)
+
+# documento único de un lote grande generado en otro proceso (el dibujo no compite con los hilos del worker)
+
+def escribe_pdf_proceso(paginas, destino):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        pool.submit(escribe_pdf, paginas, destino).result()
@@ -0,0 +1,158 @@
+# prueba de carga: repite tráfico de callbacks grabado contra un servidor en marcha y reporta latencias por callback
+# cada usuario virtual abre su propia sesión (cookie), ingresa como organizador y envía los pedidos grabados en orden
+#
+# uso, con una base local de prueba (scripts/prueba_carga.sql):
+#   1. grabar tráfico navegando la aplicación:
+#        GRABA_CALLBACKS=/tmp/callbacks.jsonl PGDATABASE=visitas_prueba gunicorn -c gunicorn.conf.py app:server
+#   2. levantar el perfil a medir (p. ej. GUNICORN_WORKER=gthread o sync, WEB_CONCURRENCY, GUNICORN_THREADS):
+#        PGDATABASE=visitas_prueba GUNICORN_WORKER=gthread gunicorn -c gunicorn.conf.py app:server
+#   3. repetir la grabación (la contraseña del organizador se lee de la variable U<organizador>, como en la aplicación):
+#        python scripts/carga_callbacks.py --grabacion /tmp/callbacks.jsonl --usuarios 20 --repeticiones 5
+#
+# los callbacks que escriben (reservar, modificar, eliminar) se repiten tal cual: se pueden omitir con --excluye
+
+import argparse
+import json
+import os
+import re
+import sys
+import time as reloj
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, HTTPCookieProcessor, build_opener
+
+
+def lee_grabacion(ruta, excluye=None):
+    with open(ruta) as archivo:
+        pedidos = [json.loads(linea) for linea in archivo if linea.strip()]
+    if excluye:
+        pedidos = [p for p in pedidos if not re.search(excluye, nombre(p))]
+    return pedidos
+
+# nombre legible del callback: primera salida (+ cantidad de salidas adicionales) o, sin salidas, su primera entrada
+
+def nombre(cuerpo):
+    salida = cuerpo['output']
+    if '.' not in salida:
+        entrada = cuerpo['inputs'][0] if cuerpo.get('inputs') else {}
+        return f"{entrada.get('id')}.{entrada.get('property')} (sin salida)"
+    partes = salida.strip('.').split('...') if salida.startswith('..') else [salida]
+    primera = partes[0].split('@')[0]
+    return primera if len(partes) == 1 else f'{primera} +{len(partes) - 1}'
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados) + 0.5) - 1))]
+
+
+class Cliente:
+
+    def __init__(self, url, prefijo):
+        self.url = url.rstrip('/') + prefijo
+        self.abridor = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def get(self, ruta):
+        with self.abridor.open(self.url + ruta, timeout=60) as respuesta:
+            return respuesta.read()
+
+    def post(self, ruta, cuerpo):
+        pedido = Request(self.url + ruta, data=json.dumps(cuerpo).encode(), headers={'Content-Type': 'application/json'})
+        try:
+            with self.abridor.open(pedido, timeout=60) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except HTTPError as error:
+            return error.code
+
+# ingreso del organizador con el callback del botón ingresar (el mismo pedido que envía el navegador)
+
+def ingresa(cliente, dependencias, usuario):
+    dep = next(d for d in dependencias if any(i['id'] == 'boton-ingresar' for i in d['inputs']))
+    valores = {
+        ('boton-ingresar', 'n_clicks'): 1,
+        ('ingreso-univ', 'value'): usuario,
+        ('ingreso-pw', 'value'): os.environ[f'U{usuario}'],
+    }
+    salidas = [dict(zip(('id', 'property'), s.rsplit('.', 1))) for s in dep['output'].strip('.').split('...')]
+    return cliente.post('_dash-update-component', {
+        'output': dep['output'],
+        'outputs': salidas if dep['output'].startswith('..') else salidas[0],
+        'inputs': [dict(i, value=valores.get((i['id'], i['property']))) for i in dep['inputs']],
+        'state': [dict(s, value=valores.get((s['id'], s['property']))) for s in dep['state']],
+        'changedPropIds': ['boton-ingresar.n_clicks'],
+    })
+
+
+def usuario_virtual(args, pedidos, dependencias):
+    cliente = Cliente(args.url, args.prefijo)
+    cliente.get('_dash-layout')
+    if args.organizador and ingresa(cliente, dependencias, args.organizador) != 200:
+        raise RuntimeError(f'no se pudo ingresar como organizador {args.organizador}')
+
+    medidas = []
+    for _ in range(args.repeticiones):
+        for cuerpo in pedidos:
+            inicio = reloj.perf_counter()
+            estado = cliente.post('_dash-update-component', cuerpo)
+            medidas.append((nombre(cuerpo), 1000 * (reloj.perf_counter() - inicio), estado))
+            if args.pausa:
+                reloj.sleep(args.pausa)
+    return medidas
+
+
+def imprime(medidas, duracion):
+    por_callback = defaultdict(list)
+    errores = defaultdict(int)
+    for callback, ms, estado in medidas:
+        por_callback[callback].append(ms)
+        # 204: callback sin salidas o sin actualización (PreventUpdate)
+        errores[callback] += estado not in (200, 204)
+
+    print(f"{'callback':<52} {'n':>6} {'errores':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for callback, tiempos in sorted(por_callback.items(), key=lambda x: -percentil(x[1], 95)):
+        print(
+            f'{callback[:52]:<52} {len(tiempos):>6} {errores[callback]:>8} {percentil(tiempos, 50):>8.1f} '
+            f'{percentil(tiempos, 95):>8.1f} {percentil(tiempos, 99):>8.1f} {max(tiempos):>8.1f}'
+        )
+    todos = [ms for _, ms, _ in medidas]
+    print(
+        f"{'total':<52} {len(todos):>6} {sum(errores.values()):>8} {percentil(todos, 50):>8.1f} "
+        f'{percentil(todos, 95):>8.1f} {percentil(todos, 99):>8.1f} {max(todos):>8.1f}'
+    )
+    print(f'{len(todos) / duracion:.1f} pedidos/s en {duracion:.1f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--grabacion', required=True)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--prefijo', default='/')
+    parser.add_argument('--usuarios', type=int, default=10)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--organizador', type=int, default=1, help='0: sin ingresar (visita)')
+    parser.add_argument('--pausa', type=float, default=0)
+    parser.add_argument('--excluye', help='expresión regular sobre el nombre del callback')
+    args = parser.parse_args()
+
+    pedidos = lee_grabacion(args.grabacion, args.excluye)
+    if not pedidos:
+        print('la grabación no tiene pedidos')
+        sys.exit(1)
+    try:
+        dependencias = json.loads(Cliente(args.url, args.prefijo).get('_dash-dependencies'))
+    except URLError as error:
+        print(f'no se pudo conectar con {args.url}: {error.reason}')
+        sys.exit(1)
+
+    print(f'{len(pedidos)} pedidos grabados x {args.repeticiones} repeticiones x {args.usuarios} usuarios')
+    inicio = reloj.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.usuarios) as pool:
+        resultados = list(pool.map(lambda _: usuario_virtual(args, pedidos, dependencias), range(args.usuarios)))
+    imprime([medida for medidas in resultados for medida in medidas], reloj.perf_counter() - inicio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# prueba de estrés de reservas concurrentes
+# lanza reservas en paralelo para una misma fecha y verifica que no se supere el cupo diario
+#
+# uso (con las mismas variables PG* de la aplicación, idealmente contra una base de prueba):
+#   python scripts/estres_reservas.py --fecha 2025-11-20 --hilos 20 --rondas 5
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.chdir(os.path.join(os.path.dirname(__file__), '..'))
+
+import app
+
+
+def visita_prueba(fecha, organizador_id):
+    return {
+        'organizador_id': organizador_id,
+        'organizador': app.universidades[organizador_id],
+        'fecha': fecha,
+        'rbd': 6000,
+        'nombre': 'PRUEBA DE ESTRÉS',
+        'direccion': None,
+        'comuna_id': 13101,
+        'hora_ini': time(9),
+        'hora_fin': time(13),
+        'hora_ins': time(8, 30),
+        'contacto': None,
+        'contacto_tel': None,
+        'contacto_mail': None,
+        'contacto_cargo': None,
+        'orientador': None,
+        'orientador_tel': None,
+        'orientador_mail': None,
+        'estatus': 'Por confirmar',
+        'observaciones': 'estres_reservas',
+    }
+
+
+def cuenta_fecha(fecha):
+    with Session(app.engine) as session:
+        return session.execute(
+            text('SELECT count(*) FROM programadas WHERE fecha = :fecha'), {'fecha': fecha}
+        ).scalar()
+
+
+def limpia(ids):
+    for id_prog in ids:
+        app.elimina_programada(id_prog)
+
+
+def ronda(fecha, hilos):
+    organizadores = list(app.universidades.keys())
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        resultados = list(pool.map(
+            lambda i: app.nueva_programada(visita_prueba(fecha, organizadores[i % len(organizadores)])),
+            range(hilos),
+        ))
+    aceptadas = [r['agrega'][0]['prog_id'] for r in resultados if not isinstance(r, app.FechaLlena)]
+    rechazadas = sum(isinstance(r, app.FechaLlena) for r in resultados)
+    return aceptadas, rechazadas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fecha', type=date.fromisoformat, required=True)
+    parser.add_argument('--hilos', type=int, default=20)
+    parser.add_argument('--rondas', type=int, default=5)
+    parser.add_argument('--cupo', type=int, default=3)
+    args = parser.parse_args()
+
+    previas = cuenta_fecha(args.fecha)
+    sobrecupo = False
+    for n in range(1, args.rondas + 1):
+        aceptadas, rechazadas = ronda(args.fecha, args.hilos)
+        total = cuenta_fecha(args.fecha)
+        print(f'ronda {n}: aceptadas={len(aceptadas)} rechazadas={rechazadas} visitas en la fecha={total}')
+        sobrecupo |= total > max(args.cupo, previas)
+        limpia(aceptadas)
+
+    if sobrecupo:
+        print('ERROR: se superó el cupo de la fecha')
+        sys.exit(1)
+    print('OK: el cupo se respetó en todas las rondas')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# medición del grafo de callbacks: pedidos HTTP y bytes por acción de usuario
+# reproduce lo que hace el navegador al disparar una acción (reservar visita, modificar visita, cambiar de mes):
+# envía cada callback de servidor afectado y sigue la cadena de salidas que son entradas de otros callbacks;
+# los callbacks del cliente se cuentan como saltos sin pedido; si la versión medida tiene el módulo metricas, también
+# las consultas a Postgres de cada acción (incluidas las de segundo plano que se ejecuten mientras tanto)
+#
+# uso (con las mismas variables PG* de la aplicación, idealmente contra una base de prueba):
+#   python scripts/grafo_callbacks.py --fecha 2025-11-20
+# para comparar con otra versión, se mide una copia de ese commit:
+#   git worktree add /tmp/antes <commit> && python scripts/grafo_callbacks.py --raiz /tmp/antes --fecha 2025-11-20
+
+import argparse
+import json
+import os
+import sys
+import time as reloj
+from collections import deque
+from datetime import date
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--raiz', default=os.path.join(os.path.dirname(__file__), '..'))
+parser.add_argument('--fecha', type=date.fromisoformat, required=True)
+parser.add_argument('--usuario', type=int, default=1)
+parser.add_argument('--rbd', type=int, default=8485)
+parser.add_argument('--mes', type=int, default=None)
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.abspath(args.raiz))
+os.chdir(args.raiz)
+os.environ.setdefault('METRICAS', '1')
+os.environ.setdefault('METRICAS_LOG', os.devnull)
+
+import app
+
+
+def dependencias(cliente):
+    return cliente.get(app.app.config.routes_pathname_prefix + '_dash-dependencies').get_json()
+
+# 'id.prop', '..a.p...b.q..' o un hash (callback sin salidas)
+
+def salidas(output):
+    if '.' not in output:
+        return []
+    partes = output.strip('.').split('...') if output.startswith('..') else [output]
+    return [dict(zip(('id', 'property'), parte.split('@')[0].rsplit('.', 1))) for parte in partes]
+
+
+def cuerpo(dep, valores, disparadores):
+    outs = salidas(dep['output'])
+    return {
+        'output': dep['output'],
+        'outputs': outs if dep['output'].startswith('..') or not outs else outs[0],
+        'inputs': [dict(i, value=valores.get((i['id'], i['property']))) for i in dep['inputs']],
+        'state': [dict(s, value=valores.get((s['id'], s['property']))) for s in dep['state']],
+        'changedPropIds': [f'{componente}.{propiedad}' for componente, propiedad in disparadores],
+    }
+
+# dispara una propiedad y recorre la cadena de callbacks como el navegador: las salidas de una respuesta disparan
+# una vez cada callback que las usa como entrada (no el mismo que las escribió); devuelve pedidos, bytes enviados
+# y recibidos, saltos del cliente y consultas
+
+def consultas_totales():
+    metricas = getattr(app, 'metricas', None)
+    return metricas.total('consultas') if metricas and metricas.activo else None
+
+
+def mide(cliente, deps, componente, propiedad, valor, valores):
+    valores = dict(valores) | {(componente, propiedad): valor}
+    pendientes = deque([({(componente, propiedad)}, None)])
+    medida = {'pedidos': 0, 'enviados': 0, 'recibidos': 0, 'cliente': 0, 'callbacks': []}
+    consultas = consultas_totales()
+    inicio = reloj.perf_counter()
+
+    while pendientes:
+        cambios, origen = pendientes.popleft()
+        for dep in deps:
+            disparadores = [(i['id'], i['property']) for i in dep['inputs'] if (i['id'], i['property']) in cambios]
+            if dep['output'] == origen or not disparadores:
+                continue
+            if dep.get('clientside_function'):
+                medida['cliente'] += 1
+                continue
+            datos = json.dumps(cuerpo(dep, valores, disparadores))
+            respuesta = cliente.post(
+                app.app.config.routes_pathname_prefix + '_dash-update-component',
+                data=datos,
+                content_type='application/json',
+            )
+            medida['pedidos'] += 1
+            medida['enviados'] += len(datos)
+            medida['recibidos'] += len(respuesta.get_data())
+            medida['callbacks'].append(dep['output'].split('@')[0][:60])
+            if respuesta.status_code != 200:
+                continue
+            nuevos = {
+                (id_componente, prop): nuevo
+                for id_componente, props in respuesta.get_json()['response'].items()
+                for prop, nuevo in props.items()
+            }
+            valores |= nuevos
+            pendientes.append((set(nuevos), dep['output']))
+
+    medida['ms'] = 1000 * (reloj.perf_counter() - inicio)
+    medida['consultas'] = consultas_totales() - consultas if consultas is not None else None
+    return medida, valores
+
+
+def imprime(nombre, medida):
+    print(
+        f"{nombre:<18} pedidos={medida['pedidos']:<3} enviados={medida['enviados']:<8} recibidos={medida['recibidos']:<9} "
+        f"saltos_cliente={medida['cliente']:<3} consultas={medida['consultas'] if medida['consultas'] is not None else '-':<4} "
+        f"{medida['ms']:.0f} ms"
+    )
+    for callback in medida['callbacks']:
+        print(f'    {callback}')
+
+# estado de navegación: sesión del servidor si existe el módulo sesiones; si no, el store parametros
+
+def prepara(cliente, mes):
+    cliente.get(app.app.config.routes_pathname_prefix + '_dash-layout')
+    param = dict(app.parametros_iniciales) | {'user': args.usuario, 'mes': mes, 'tab_edit': 'tab-ed2'}
+    if hasattr(app, 'sesiones'):
+        id_sesion = app.sesiones.config['firma'].loads(cliente.get_cookie(app.sesiones.nombre_cookie).value)
+        app.sesiones.almacen.guarda(id_sesion, param)
+        return {}
+    return {('parametros', 'data'): param}
+
+
+def main():
+    cliente = app.server.test_client()
+    deps = dependencias(cliente)
+    mes = args.mes or args.fecha.month
+    valores = prepara(cliente, mes)
+
+    medida, _ = mide(cliente, deps, 'selec-mes', 'value', mes, valores | {('selec-temporada', 'value'): app.temporada})
+    imprime('cambio de mes', medida)
+
+    formulario = {
+        ('sel-fecha', 'date'): args.fecha.isoformat(),
+        ('sel-rbd', 'value'): args.rbd,
+        ('id-comuna', 'value'): app.colegios_comuna.get(args.rbd),
+        ('hr-inicio', 'value'): '09:00:00',
+        ('hr-termino', 'value'): '13:00:00',
+        ('def-estatus', 'value'): 'Por confirmar',
+        ('obs-texto', 'value'): 'grafo_callbacks',
+    }
+    previas = {fila['prog_id'] for fila in app.programadas_fecha(args.fecha)}
+    medida, _ = mide(cliente, deps, 'ag-visita', 'n_clicks', 1, valores | formulario)
+    imprime('reserva de visita', medida)
+
+    nuevas = [fila['prog_id'] for fila in app.programadas_fecha(args.fecha) if fila['prog_id'] not in previas]
+    if not nuevas:
+        print('no se pudo reservar la fecha (sin cupo o no reservable): no se mide la modificación')
+        return
+    seleccion = {('ferias-prg-usr', 'selectedRows'): [{'prog_id': nuevas[0], 'fecha': args.fecha.isoformat(), 'organizador_id': args.usuario}]}
+
+    total = {'pedidos': 0, 'enviados': 0, 'recibidos': 0, 'cliente': 0, 'callbacks': [], 'ms': 0, 'consultas': 0}
+    pasos = [
+        ('ferias-prg-usr', 'selectedRows', seleccion[('ferias-prg-usr', 'selectedRows')]),
+        ('btn-mod-visita', 'n_clicks', 1),
+        ('btn-mod-aplica', 'n_clicks', 1),
+    ]
+    estado = valores | seleccion | {
+        ('mod-fecha', 'date'): args.fecha.isoformat(),
+        ('mod-id-comuna', 'value'): app.colegios_comuna.get(args.rbd),
+        ('mod-estatus', 'value'): 'Confirmada',
+    }
+    for componente, propiedad, valor in pasos:
+        medida, estado = mide(cliente, deps, componente, propiedad, valor, estado)
+        for clave in ('pedidos', 'enviados', 'recibidos', 'cliente', 'callbacks', 'ms'):
+            total[clave] += medida[clave]
+        total['consultas'] = None if medida['consultas'] is None else total['consultas'] + medida['consultas']
+    imprime('modificación', total)
+
+    app.elimina_programada(nuevas[0])
+
+
+if __name__ == '__main__':
+    main()
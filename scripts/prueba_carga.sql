@@ -0,0 +1,133 @@
+-- base de prueba para la prueba de carga (scripts/carga_callbacks.py): esquema de la aplicación con una temporada
+-- de visitas generada (por omisión 2 visitas por día hábil de la temporada 2025, bajo el cupo diario de 3)
+--
+-- BORRA las tablas de la base donde se ejecuta: usar solo en una base local, p. ej.
+--   createdb visitas_prueba && PGDATABASE=visitas_prueba psql -f scripts/prueba_carga.sql
+-- para otra temporada o volumen se editan los valores de parametros
+
+CREATE TEMP TABLE parametros AS SELECT 2025 AS temporada, 2 AS por_dia;
+
+DROP TABLE IF EXISTS asisten, programadas, propuestas CASCADE;
+
+CREATE TABLE programadas (
+    prog_id smallserial PRIMARY KEY,
+    organizador_id smallint,
+    organizador text,
+    fecha date,
+    rbd integer,
+    nombre text,
+    direccion text,
+    comuna_id smallint,
+    hora_ini time,
+    hora_fin time,
+    hora_ins time,
+    contacto text,
+    contacto_tel text,
+    contacto_mail text,
+    contacto_cargo text,
+    orientador text,
+    orientador_tel text,
+    orientador_mail text,
+    estatus text,
+    observaciones text
+);
+
+CREATE TABLE propuestas (
+    prop_id smallserial PRIMARY KEY,
+    organizador_id smallint,
+    organizador text,
+    rbd integer,
+    nombre text
+);
+
+CREATE TABLE asisten (
+    programada_id smallint REFERENCES programadas ON DELETE CASCADE,
+    organizador_id smallint,
+    asiste smallint,
+    PRIMARY KEY (programada_id, organizador_id)
+);
+
+CREATE INDEX ix_programadas_fecha ON programadas (fecha);
+CREATE INDEX ix_asisten_programada ON asisten (programada_id);
+
+-- universidades de la aplicación (diccionario universidades de app.py)
+CREATE TEMP TABLE universidades (organizador_id smallint, organizador text);
+INSERT INTO universidades VALUES
+    (1, 'Universidad Gabriela Mistral'),
+    (2, 'Universidad Finis Terrae'),
+    (4, 'Universidad Central de Chile'),
+    (9, 'Universidad del Alba'),
+    (11, 'Universidad Academia de Humanismo Cristiano'),
+    (13, 'Universidad Santo Tomás'),
+    (17, 'Universidad SEK'),
+    (19, 'Universidad de Las Américas'),
+    (26, 'Universidad de Artes, Ciencias y Comunicación UNIACC'),
+    (31, 'Universidad Autónoma de Chile'),
+    (39, 'Universidad San Sebastián'),
+    (42, 'Universidad Católica Cardenal Raúl Silva Henríquez'),
+    (50, 'Universidad Bernardo O''Higgins'),
+    (68, 'Universidad Miguel de Cervantes');
+
+-- cada visita nueva registra la asistencia de todas las universidades (1: organizador, 0: resto)
+CREATE OR REPLACE FUNCTION crea_asisten() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO asisten
+    SELECT NEW.prog_id, u, CASE WHEN u = NEW.organizador_id THEN 1 ELSE 0 END
+    FROM unnest(ARRAY[1, 2, 4, 9, 11, 13, 17, 19, 26, 31, 39, 42, 50, 68]) u;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tr_asisten AFTER INSERT ON programadas FOR EACH ROW EXECUTE FUNCTION crea_asisten();
+
+-- fechas con el cupo diario completo
+CREATE OR REPLACE FUNCTION bloqueadas() RETURNS SETOF date AS $$
+    SELECT fecha FROM programadas GROUP BY fecha HAVING count(*) >= 3 ORDER BY fecha
+$$ LANGUAGE sql;
+
+-- visitas de la temporada: por_dia visitas en cada día hábil, con organizadores y colegios rotativos
+WITH colegios (i, rbd) AS (
+    SELECT i, rbd FROM unnest(ARRAY[
+        8485, 8487, 8488, 8489, 8490, 8491, 8492, 8494, 8495, 8496, 8497, 8498,
+        8499, 8500, 8501, 8502, 8503, 8504, 8505, 8506, 8507, 8508, 8510, 8511
+    ]) WITH ORDINALITY AS c (rbd, i)
+),
+organizadores AS (
+    SELECT row_number() OVER (ORDER BY organizador_id) AS i, organizador_id, organizador FROM universidades
+),
+dias AS (
+    SELECT d::date AS fecha, row_number() OVER (ORDER BY d) AS n
+    FROM parametros, generate_series(make_date(temporada, 3, 1), make_date(temporada, 11, 30), interval '1 day') d
+    WHERE extract(isodow FROM d) < 6
+),
+visitas AS (
+    SELECT fecha, n * por_dia + k AS j
+    FROM dias, parametros, generate_series(1, por_dia) k
+)
+INSERT INTO programadas (
+    organizador_id, organizador, fecha, rbd, nombre, direccion, comuna_id, hora_ini, hora_fin, hora_ins,
+    contacto, contacto_tel, contacto_mail, estatus, observaciones
+)
+SELECT
+    o.organizador_id, o.organizador, v.fecha, c.rbd, 'COLEGIO ' || c.rbd, 'Dirección ' || v.j, 13101,
+    '09:00', '13:00', '08:30', 'Contacto ' || v.j, '+56 9 0000 0000', 'contacto@example.com',
+    CASE WHEN v.j % 4 = 0 THEN 'Por confirmar' ELSE 'Confirmada' END, 'prueba_carga'
+FROM visitas v
+JOIN organizadores o ON o.i = 1 + v.j % 14
+JOIN colegios c ON c.i = 1 + v.j % 24
+ORDER BY v.fecha, v.j;
+
+-- algunas universidades confirman asistencia a visitas de otras
+UPDATE asisten SET asiste = 1 WHERE (programada_id + organizador_id) % 5 = 0;
+
+-- colegios propuestos por cada universidad
+INSERT INTO propuestas (organizador_id, organizador, rbd, nombre)
+SELECT o.organizador_id, o.organizador, c.rbd, 'COLEGIO ' || c.rbd
+FROM universidades o
+JOIN unnest(ARRAY[8485, 8487, 8488, 8489, 8490]) AS c (rbd) ON true;
+
+ANALYZE programadas;
+ANALYZE asisten;
+ANALYZE propuestas;
+
+-- contador de versiones que mantiene al día las copias de cada worker
+\ir versiones.sql
@@ -0,0 +1,12 @@
+-- índice por fecha de programadas: las consultas de la aplicación se limitan al rango de una temporada
+-- (fecha BETWEEN inicio AND fin), de modo que las temporadas anteriores no se leen en cada consulta
+--
+-- uso: psql -f scripts/temporadas.sql
+
+CREATE INDEX IF NOT EXISTS ix_programadas_fecha ON programadas (fecha);
+
+-- la lectura de asistentes por temporada une asisten con programadas por la clave de la visita
+CREATE INDEX IF NOT EXISTS ix_asisten_programada ON asisten (programada_id);
+
+ANALYZE programadas;
+ANALYZE asisten;
@@ -0,0 +1,30 @@
+-- contador de versiones por tabla: cada worker de la aplicación guarda sus propias copias de programadas, asisten y
+-- propuestas, y al atender un pedido compara el contador con el que tenía la base al leer cada copia (si difiere, la
+-- relee). Los triggers lo incrementan una vez por sentencia que modifica la tabla, en la misma transacción
+--
+-- uso: psql -f scripts/versiones.sql
+
+CREATE TABLE IF NOT EXISTS versiones (
+    tabla text PRIMARY KEY,
+    version bigint NOT NULL DEFAULT 0
+);
+
+INSERT INTO versiones (tabla) VALUES ('programadas'), ('asisten'), ('propuestas') ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION incrementa_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE versiones SET version = version + 1 WHERE tabla = TG_TABLE_NAME;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_version_programadas ON programadas;
+CREATE TRIGGER tr_version_programadas AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON programadas
+    FOR EACH STATEMENT EXECUTE FUNCTION incrementa_version();
+
+DROP TRIGGER IF EXISTS tr_version_asisten ON asisten;
+CREATE TRIGGER tr_version_asisten AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON asisten
+    FOR EACH STATEMENT EXECUTE FUNCTION incrementa_version();
+
+DROP TRIGGER IF EXISTS tr_version_propuestas ON propuestas;
+CREATE TRIGGER tr_version_propuestas AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON propuestas
+    FOR EACH STATEMENT EXECUTE FUNCTION incrementa_version();
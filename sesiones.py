@@ -0,0 +1,163 @@
+### Sesiones en el servidor
+# estado de navegación de cada navegador (usuario acreditado, mes y temporada, pestañas, visita en edición) guardado
+# en el servidor; el navegador solo lleva una cookie firmada con el identificador de la sesión, de modo que el usuario
+# acreditado no se puede modificar desde el cliente y el estado no viaja en cada callback. Las pestañas de un mismo
+# navegador comparten la sesión.
+#
+# almacenamiento en memoria del worker (por omisión) o en una base SQLite local (SESIONES_SQLITE=ruta), que
+# comparten los workers de un mismo servidor. Cada pedido guarda solo las claves que modificó, de modo que dos
+# callbacks simultáneos de la misma sesión no se pisan.
+
+import os
+import json
+import secrets
+import sqlite3
+import threading
+import time as reloj
+
+from flask import request, g
+from itsdangerous import URLSafeSerializer, BadSignature
+
+nombre_cookie = os.environ.get('COOKIE_SESION', 'sesion-visitas')
+duracion = int(os.environ.get('DURACION_SESION', 8 * 3600))
+
+
+# diccionario de la sesión del pedido: registra las claves modificadas
+
+class Sesion(dict):
+
+    def __init__(self, id_sesion, datos, nueva=False):
+        super().__init__(datos)
+        self.id = id_sesion
+        self.nueva = nueva
+        self.cambios = set(datos) if nueva else set()
+
+    def __setitem__(self, clave, valor):
+        super().__setitem__(clave, valor)
+        self.cambios.add(clave)
+
+
+# almacenamiento en memoria: id -> (vencimiento, datos)
+
+class Memoria:
+
+    def __init__(self):
+        self.sesiones = {}
+        self.candado = threading.Lock()
+        self.purgado = reloj.monotonic()
+
+    def lee(self, id_sesion):
+        with self.candado:
+            vence, datos = self.sesiones.get(id_sesion, (0, None))
+            return dict(datos) if vence > reloj.monotonic() else None
+
+    def guarda(self, id_sesion, cambios):
+        ahora = reloj.monotonic()
+        with self.candado:
+            _, datos = self.sesiones.get(id_sesion, (0, {}))
+            self.sesiones[id_sesion] = (ahora + duracion, datos | cambios)
+            if ahora - self.purgado > 60:
+                self.sesiones = {k: v for k, v in self.sesiones.items() if v[0] > ahora}
+                self.purgado = ahora
+
+
+# almacenamiento en SQLite: una fila por clave (valores en JSON), con una conexión por hilo; un proceso hijo no usa
+# las conexiones heredadas (SQLite no admite compartirlas entre procesos) y abre las suyas
+
+class SQLite:
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.local = threading.local()
+        os.register_at_fork(after_in_child=self.reinicia)
+        with self.conexion() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS sesiones (id TEXT, clave TEXT, valor TEXT, vence REAL, PRIMARY KEY (id, clave))'
+            )
+            conexion.execute('DELETE FROM sesiones WHERE vence < ?', (reloj.time(),))
+
+    def reinicia(self):
+        self.local = threading.local()
+
+    def conexion(self):
+        if not hasattr(self.local, 'conexion'):
+            self.local.conexion = sqlite3.connect(self.ruta, timeout=10)
+        return self.local.conexion
+
+    def lee(self, id_sesion):
+        filas = self.conexion().execute(
+            'SELECT clave, valor FROM sesiones WHERE id = ? AND vence > ?', (id_sesion, reloj.time())
+        ).fetchall()
+        return {clave: json.loads(valor) for clave, valor in filas} if filas else None
+
+    def guarda(self, id_sesion, cambios):
+        vence = reloj.time() + duracion
+        with self.conexion() as conexion:
+            conexion.executemany(
+                'INSERT INTO sesiones VALUES (?, ?, ?, ?) ON CONFLICT (id, clave) DO UPDATE SET valor = excluded.valor, vence = excluded.vence',
+                [(id_sesion, clave, json.dumps(valor), vence) for clave, valor in cambios.items()],
+            )
+            conexion.execute('UPDATE sesiones SET vence = ? WHERE id = ?', (vence, id_sesion))
+
+
+almacen = SQLite(os.environ['SESIONES_SQLITE']) if os.environ.get('SESIONES_SQLITE') else Memoria()
+
+config = {
+    'firma': None,
+    'iniciales': {},
+}
+
+# enlaza las sesiones con el servidor Flask: la sesión se lee al primer uso en el pedido y se guarda al responder
+
+def instala(server, clave, iniciales):
+    config['firma'] = URLSafeSerializer(clave, salt='sesion')
+    config['iniciales'] = dict(iniciales)
+    server.after_request(guarda)
+
+
+def inicia(datos=None):
+    g.sesion = Sesion(secrets.token_urlsafe(24), config['iniciales'] if datos is None else datos, nueva=True)
+    return g.sesion
+
+
+# carga de la página (una recarga o una pestaña nueva del mismo navegador): conserva la sesión vigente, cuyo usuario
+# acreditado comparten las pestañas, y solo devuelve a su valor inicial las claves indicadas
+
+def reinicia(claves):
+    sesion = actual()
+    for clave in claves:
+        sesion[clave] = config['iniciales'][clave]
+    return sesion
+
+
+def actual():
+    if 'sesion' in g:
+        return g.sesion
+    try:
+        id_sesion = config['firma'].loads(request.cookies.get(nombre_cookie, ''))
+    except BadSignature:
+        return inicia()
+    datos = almacen.lee(id_sesion)
+    if datos is None:
+        return inicia()
+    g.sesion = Sesion(id_sesion, config['iniciales'] | datos)
+    return g.sesion
+
+
+def guarda(respuesta):
+    sesion = g.get('sesion')
+    if sesion is None:
+        return respuesta
+    if sesion.cambios:
+        almacen.guarda(sesion.id, {clave: sesion[clave] for clave in sesion.cambios})
+    if sesion.nueva:
+        respuesta.set_cookie(
+            nombre_cookie,
+            config['firma'].dumps(sesion.id),
+            max_age=duracion,
+            httponly=True,
+            samesite='Lax',
+            secure=request.is_secure,
+        )
+    return respuesta